@@ -1,3 +1,5 @@
+import hashlib
+import os
 from pyproj import Proj
 from geopandas import GeoDataFrame
 import numpy as np
@@ -6,6 +8,7 @@ from rasterio.vrt import WarpedVRT
 from rasterio import DatasetReader
 from rasterio.io import MemoryFile
 from rasterio.enums import Resampling
+from rasterio.shutil import copy as rio_copy
 from shapely.geometry import box
 from shapely.ops import unary_union
 from affine import Affine
@@ -30,6 +33,9 @@ class GeoDataFrameManager:
     @property
     def geom_unit_id(self) -> str:
         proj_str = Proj(self.gdf.crs).definition_string()
+        if "proj=longlat" in proj_str.split():
+            # geographic coordinates have no units= parameter
+            return "degree"
         return [_[_.find("=") + 1:] for _ in proj_str.split()
                 if _.startswith("units=")][0]
 
@@ -37,6 +43,14 @@ class GeoDataFrameManager:
     def geom_unit_name(self):
         return UnitHandler(self.geom_unit_id).fullname
 
+    @property
+    def fingerprint(self) -> str:
+        """sha1 digest of the geometries and CRS, used as a cache key."""
+        sha = hashlib.sha1(str(self.gdf.crs).encode())
+        for wkb in self.gdf.geometry.to_wkb():
+            sha.update(wkb)
+        return sha.hexdigest()
+
     @classmethod
     def from_shp(cls, shp_path):
         assert shp_path.endswith(".shp"), "Not a valid shapefile."
@@ -207,15 +221,65 @@ class RasterManager:
         # get rasterio.crs from the raster dataset
         return self.rast_ds.crs
 
-    def to_array(self):
+    def to_array(self, bidx=1):
         # return a numpy.ndarray
-        return self.rast_ds.read(1)
+        return self.rast_ds.read(bidx)
 
     def get_affine(self):
         return self.rast_ds.transform
 
-    def as_rebuild_info(self):
-        rast_band = self.to_array()
+    @property
+    def nodata(self):
+        # the nodata value used by as_rebuild_info and read_window
+        if self.rast_nodata is not None:
+            return self.rast_nodata
+        return self.rast_ds.nodata
+
+    def read_window(self, window, bidx=1):
+        """Cells of window, with the nodata cells of the dataset set to the
+        nodata value of the manager, as in ``as_rebuild_info``."""
+        rast_arr = self.rast_ds.read(bidx, window=window)
+        if self.rast_nodata is not None and self.rast_ds.nodata is not None:
+            rast_arr[rast_arr == self.rast_ds.nodata] = self.rast_nodata
+        return rast_arr
+
+    def iter_blocks(self, bidx=1):
+        # yield (window, array) for each internal block (tile or strip)
+        for _, window in self.rast_ds.block_windows(bidx):
+            yield window, self.rast_ds.read(bidx, window=window)
+
+    def argwhere(self, value, bidx=1):
+        """(row, column) indices of the cells equal to value.
+
+        The band is read block by block, so the peak memory is bounded by one
+        block plus the matching indices.
+        """
+        return self.argwhere_values([value], bidx)[value]
+
+    def argwhere_values(self, values, bidx=1):
+        """Dict of ``{value: (row, column) indices of the cells equal to
+        value}``, collected for all values in a single pass over the blocks.
+        """
+        indices = {v: [np.empty((0, 2), dtype=np.int64)] for v in values}
+        for window, block in self.iter_blocks(bidx):
+            rows, cols = np.nonzero(np.isin(block, values))
+            if not rows.size:
+                continue
+            cell_values = block[rows, cols]
+            # bucket the matching cells by value
+            order = np.argsort(cell_values, kind="stable")
+            uniques, starts = np.unique(cell_values[order], return_index=True)
+            bounds = np.append(starts, len(order))
+            for v, start, stop in zip(uniques, bounds[:-1], bounds[1:]):
+                bucket = order[start:stop]
+                indices[v].append(np.column_stack(
+                    (rows[bucket] + window.row_off,
+                     cols[bucket] + window.col_off)
+                ))
+        return {v: np.vstack(arrs) for v, arrs in indices.items()}
+
+    def as_rebuild_info(self, bidx=1):
+        rast_band = self.to_array(bidx)
         rast_affine = self.rast_ds.transform
         if self.rast_nodata is not None:
             rast_band[
@@ -233,8 +297,37 @@ class RasterManager:
     def wkt(self):
         return self.rast_ds.crs.to_wkt()
 
-    def reproject_vrt(self, crs=None):
-        return WarpedVRT(self.rast_ds, crs=crs)
+    def reproject_vrt(self, crs=None, **vrt_options):
+        return WarpedVRT(self.rast_ds, crs=crs, **vrt_options)
+
+    def reproject_cached(self, crs, cache_dir, **vrt_options):
+        """Open the raster warped to crs from a GeoTIFF in cache_dir.
+
+        The GeoTIFF is written by the first call, and keyed by the path and
+        modification time of the raster, crs and vrt_options, so later calls
+        read it without warping. Rasters that are not local files (e.g., on
+        PostgreSQL) are warped through a WarpedVRT.
+        """
+        rast_path = self.rast_ds.name
+        if not os.path.isfile(rast_path):
+            return self.reproject_vrt(crs, **vrt_options)
+        key = "|".join([os.path.abspath(rast_path),
+                        str(os.stat(rast_path).st_mtime_ns),
+                        rio.crs.CRS.from_user_input(crs).to_wkt(),
+                        repr(sorted(vrt_options.items()))])
+        cache_path = os.path.join(
+            cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".tif"
+        )
+        if not os.path.exists(cache_path):
+            os.makedirs(cache_dir, exist_ok=True)
+            # write to a temporary file first, so that a concurrent reader
+            # never opens a partial GeoTIFF
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with self.reproject_vrt(crs, **vrt_options) as vrt:
+                rio_copy(vrt, temp_path, driver="GTiff", tiled=True,
+                         compress="deflate")
+            os.replace(temp_path, cache_path)
+        return rio.open(cache_path)
 
     @classmethod
     def from_path(cls, rast_path, nodata=None):
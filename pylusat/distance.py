@@ -1,9 +1,16 @@
+import copy
+import os
+from collections import OrderedDict
 import numpy as np
 from geopandas import GeoDataFrame
-from pandas import Series
+from pandas import Series, DataFrame
+from scipy.spatial import cKDTree
 from pylusat.base import GeoDataFrameManager
 from pylusat.base import RasterManager
 from pylusat.utils import rasterize_geometry, cntrd_array, inv_affine
+from pylusat.utils import segment_array, split_segments
+from pylusat.utils import write_raster, iter_chunks
+from pylusat.utils import sphere_array, chord_to_arc, workers_kwarg
 
 
 class _ArrayDistance:
@@ -20,28 +27,488 @@ class _ArrayDistance:
 
     @staticmethod
     def _kdtree(target_arr):
-        from scipy.spatial import cKDTree
         return cKDTree(target_arr)
 
-    def query(self, source_arr, target_arr):
-        # query distance from source_arr to target_arr
-        kdtree = self._kdtree(target_arr)
-        dist_method = 1 if self.method.lower() == 'manhattan' else 2
-        dist_arr = kdtree.query(source_arr, p=dist_method)[0]
+    @property
+    def p(self):
+        # which Minkowski p-norm to use
+        return 1 if self.method.lower() == 'manhattan' else 2
+
+    def query(self, source_arr, target, workers=1):
+        # query distance from source_arr to target (an array or a cKDTree)
+        kdtree = target if isinstance(target, cKDTree) \
+            else self._kdtree(target)
+        dist_arr = kdtree.query(source_arr, p=self.p,
+                                **workers_kwarg(workers))[0]
         if self.dtype is not float:
             return dist_arr.astype(self.dtype)
         else:
             return dist_arr
 
 
+class _LRUCache:
+    """A size-limited, least-recently-used cache of DistanceIndex objects."""
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return None
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+# Indexes built from GeoDataFrames and rasters are kept here, keyed on the
+# target geometry (or raster file), cellsize and value. Set
+# ``index_cache.maxsize`` to change the limit, 0 disables caching.
+index_cache = _LRUCache()
+
+
+def _raster_key(raster):
+    """Identify a raster by its absolute path and modification time."""
+    path = raster if isinstance(raster, str) else raster.name
+    try:
+        return os.path.abspath(path), os.path.getmtime(path)
+    except OSError:  # not a file on disk, e.g. a MemoryFile or a VRT
+        return path, id(raster)
+
+
+def _cached(key, builder, cache):
+    if not cache:
+        return builder()
+    index = index_cache.get(key)
+    if index is None:
+        index = builder()
+        index_cache.put(key, index)
+    return index
+
+
+class DistanceIndex:
+    """
+    A reusable index of distance targets.
+
+    Building the KD-tree over the targets is the most expensive step of a
+    distance query. A ``DistanceIndex`` is built once and can be passed in
+    place of the target data to ``to_point``, ``to_line`` and ``to_cell``,
+    so repeated queries against the same target skip index construction.
+
+    Parameters
+    ----------
+    target_arr : numpy.ndarray
+        An n by 2 array of target coordinates, either (x, y) coordinates or
+        (row, column) indices on a grid.
+    target_type : str
+        One of "Point", "Line" or "Raster".
+    cellsize : float, optional
+        Cell size of the grid, if ``target_arr`` contains (row, column)
+        indices.
+    max_y, min_x : float, optional
+        Upper bound on the y axis and lower bound on the x axis of the grid.
+    target_gdf : geopandas.GeoDataFrame, optional
+        The GeoDataFrame of the targets, in the same order as target_arr,
+        from which index labels and attributes of the nearest targets are
+        retrieved.
+
+    Examples
+    --------
+    Build the index over schools once and reuse it for several inputs.
+
+    >>> schools_idx = pylusat.distance.DistanceIndex.from_points(schools_gdf)
+    >>> pylusat.distance.to_point(acs2016_gdf, schools_idx)
+    >>> pylusat.distance.to_point(parcels_gdf, schools_idx)
+    """
+
+    def __init__(self, target_arr, target_type,
+                 cellsize=None, max_y=None, min_x=None, target_gdf=None):
+        self.target_type = target_type
+        self.target_gdf = target_gdf
+        self.cellsize = cellsize
+        self.max_y = max_y
+        self.min_x = min_x
+        self.size = len(target_arr)
+        self.kdtree = cKDTree(target_arr) if self.size else None
+
+    @property
+    def is_grid(self):
+        return self.cellsize is not None
+
+    def _bind(self, target_gdf):
+        """A shallow copy of the index, sharing its KD-tree, whose index
+        labels and attributes are those of target_gdf."""
+        index = copy.copy(self)
+        index.target_gdf = target_gdf
+        return index
+
+    def source_array(self, input_gdf):
+        """Coordinates of the input centroids in the space of the index."""
+        if self.is_grid:
+            return inv_affine(input_gdf, self.cellsize, self.max_y, self.min_x)
+        return cntrd_array(input_gdf)
+
+    def _to_distance(self, dist_arr):
+        # convert distances in the space of the index to the input's unit
+        if self.is_grid:
+            dist_arr *= self.cellsize
+        return dist_arr
+
+    def _query(self, source_arr, dist_obj, workers):
+        return self._to_distance(
+            dist_obj.query(source_arr, self.kdtree, workers)
+        )
+
+    def query(self, input_gdf, method="euclidean", dtype=float,
+              workers=1, chunk_size=None):
+        """
+        Distances from each geometry in input_gdf to its nearest target.
+
+        Parameters
+        ----------
+        input_gdf : geopandas.GeoDataFrame
+            Input GeoDataFrame. Centroids of the input geometries are used.
+        method : str, optional
+            Either 'euclidean' or 'manhattan'.
+        dtype : str or numpy.dtype, optional
+            The data type of the output distances.
+        workers : int, optional, default 1
+            Number of threads used to query the KD-tree, -1 uses all cores.
+        chunk_size : int, optional
+            Number of input geometries queried at a time. By default all
+            geometries are queried at once.
+
+        Returns
+        -------
+        numpy.ndarray
+            Distances in the unit of the input's coordinate system, NaN if
+            the index does not contain any target.
+        """
+        n = len(input_gdf.index)
+        if not self.size:
+            return np.full(n, np.nan)
+        dist_obj = _ArrayDistance(self.target_type, method, float)
+        dist_arr = np.empty(n, dtype=dtype)
+        for start, stop in iter_chunks(n, chunk_size):
+            source_arr = self.source_array(input_gdf.iloc[start:stop])
+            dist_arr[start:stop] = self._query(source_arr, dist_obj, workers)
+        return dist_arr
+
+    def query_neighbors(self, input_gdf, k=1, method="euclidean",
+                        workers=1, chunk_size=None):
+        """
+        The k nearest targets of each geometry in input_gdf.
+
+        Parameters
+        ----------
+        input_gdf : geopandas.GeoDataFrame
+            Input GeoDataFrame. Centroids of the input geometries are used.
+        k : int, optional, default 1
+            Number of nearest targets.
+        method : str, optional
+            Either 'euclidean' or 'manhattan'.
+        workers, chunk_size : int, optional
+            See ``DistanceIndex.query``.
+
+        Returns
+        -------
+        dist_arr : numpy.ndarray
+            An n by k array of distances, sorted from the nearest.
+        pos_arr : numpy.ndarray
+            An n by k array of the (integer) positions of the targets.
+        """
+        if not (isinstance(k, int) and 1 <= k <= self.size):
+            raise ValueError("k must be a positive integer that is less than "
+                             "or equal to the number of targets.")
+        n = len(input_gdf.index)
+        dist_obj = _ArrayDistance(self.target_type, method, float)
+        dist_arr = np.empty((n, k))
+        pos_arr = np.empty((n, k), dtype=np.intp)
+        for start, stop in iter_chunks(n, chunk_size):
+            source_arr = self.source_array(input_gdf.iloc[start:stop])
+            dd, ii = self.kdtree.query(source_arr, k=k, p=dist_obj.p,
+                                       **workers_kwarg(workers))
+            dist_arr[start:stop] = self._to_distance(dd.reshape(-1, k))
+            pos_arr[start:stop] = ii.reshape(-1, k)
+        return dist_arr, pos_arr
+
+    @classmethod
+    def from_points(cls, point_gdf, great_circle=False, cache=True):
+        """Build (or fetch from ``index_cache``) an index over points.
+
+        With ``great_circle=True`` the points, which must be in a geographic
+        CRS, are indexed as 3D coordinates on the unit sphere and distances
+        are great circle distances in meters.
+        """
+        _validate_target_geom(point_gdf, "Point")
+        key = ("Point", GeoDataFrameManager(point_gdf).fingerprint,
+               great_circle)
+
+        def build():
+            if great_circle:
+                _validate_geographic(point_gdf)
+                return _SphereIndex(point_gdf)
+            return cls(cntrd_array(point_gdf), "Point")
+        # only the geometries are cached, the index labels and attributes
+        # are those of this point_gdf
+        return _cached(key, build, cache)._bind(point_gdf)
+
+    @classmethod
+    def from_lines(cls, line_gdf, cellsize=30, engine="raster", cache=True):
+        """Build (or fetch from ``index_cache``) an index over lines.
+
+        With ``engine="raster"`` the lines are burned into a grid of the
+        given cell size. With ``engine="vector"`` the line segments are
+        indexed directly and ``cellsize`` is not used.
+        """
+        _validate_target_geom(line_gdf, "Line")
+        if engine not in ("raster", "vector"):
+            raise ValueError('engine must be either "raster" or "vector".')
+        if engine == "vector":
+            key = ("Line", GeoDataFrameManager(line_gdf).fingerprint, engine)
+            return _cached(key, lambda: _SegmentIndex(line_gdf), cache)
+        key = ("Line", GeoDataFrameManager(line_gdf).fingerprint, cellsize)
+
+        def build():
+            line_grid, _, extent, nodata = rasterize_geometry(line_gdf,
+                                                              cellsize)
+            return cls(np.argwhere(line_grid != nodata), "Line",
+                       cellsize=cellsize, max_y=extent[3], min_x=extent[0])
+        return _cached(key, build, cache)
+
+    @classmethod
+    def from_raster(cls, raster, value, nodata=None, cache=True):
+        """Build (or fetch from ``index_cache``) an index over the cells of a
+        raster that have a specific value."""
+        key = ("Raster", _raster_key(raster), value, nodata)
+
+        def build():
+            return cls.from_raster_values(raster, [value], nodata,
+                                          cache=False)[value]
+        return _cached(key, build, cache)
+
+    @classmethod
+    def from_raster_values(cls, raster, values, nodata=None, cache=True):
+        """Build (or fetch from ``index_cache``) an index for each value in
+        values. The cells of all values not yet cached are collected in a
+        single pass over the raster.
+
+        Returns
+        -------
+        dict
+            Dict of ``{value: DistanceIndex}``.
+        """
+        keys = {v: ("Raster", _raster_key(raster), v, nodata) for v in values}
+        indexes = {v: index_cache.get(keys[v]) if cache else None
+                   for v in values}
+        missing = [v for v, index in indexes.items() if index is None]
+        if missing:
+            rast_manager = RasterManager(raster, nodata)
+            rast_affine = rast_manager.get_affine()
+            cells = rast_manager.argwhere_values(missing)
+            for v in missing:
+                indexes[v] = cls(cells[v], "Raster", cellsize=rast_affine[0],
+                                 max_y=rast_affine[5], min_x=rast_affine[2])
+                if cache:
+                    index_cache.put(keys[v], indexes[v])
+        return indexes
+
+
+class _SphereIndex(DistanceIndex):
+    """
+    A DistanceIndex over points in a geographic CRS, indexed as 3D
+    coordinates on the unit sphere. The nearest point by chord length is the
+    nearest by great circle distance, which is returned in meters.
+    """
+
+    def __init__(self, point_gdf):
+        super().__init__(sphere_array(point_gdf), "Point")
+
+    def source_array(self, input_gdf):
+        return sphere_array(input_gdf)
+
+    def _to_distance(self, dist_arr):
+        return chord_to_arc(dist_arr)
+
+
+def _validate_geographic(gdf):
+    if GeoDataFrameManager(gdf).geom_unit_id != "degree":
+        raise ValueError('method "great_circle" requires GeoDataFrames in a '
+                         'geographic (longitude, latitude) CRS.')
+
+
+def _segment_distance(pnt_arr, seg_arr, p=2):
+    """Distance (p=2 euclidean, p=1 manhattan) from each point to the
+    segment in the same row."""
+    start = seg_arr[:, :2]
+    delta = seg_arr[:, 2:] - start
+    offset = pnt_arr - start
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if p == 2:
+            # parameter of the projection of the point onto the segment
+            t = np.clip(np.nan_to_num(
+                (offset * delta).sum(axis=1) / (delta * delta).sum(axis=1)
+            ), 0, 1)
+            return np.hypot(*(offset - t[:, None] * delta).T)
+        # manhattan distance is piecewise linear along the segment, the
+        # minimum is at either end or where the segment crosses the vertical
+        # or horizontal line through the point
+        t = np.column_stack((np.zeros(len(seg_arr)), np.ones(len(seg_arr)),
+                             offset / delta))
+    t = np.clip(np.nan_to_num(t, nan=0, posinf=0, neginf=0), 0, 1)
+    diff = offset[:, None, :] - t[:, :, None] * delta[:, None, :]
+    return np.abs(diff).sum(axis=2).min(axis=1)
+
+
+class _SegmentIndex(DistanceIndex):
+    """
+    A DistanceIndex over line segments which gives exact point-to-line
+    distances. The KD-tree is built on segment midpoints, so memory scales
+    with the number of vertices rather than the area of the extent.
+    """
+
+    N_CANDIDATES = 8
+
+    def __init__(self, line_gdf):
+        segments = segment_array(line_gdf)[0]
+        lengths = np.hypot(segments[:, 2] - segments[:, 0],
+                           segments[:, 3] - segments[:, 1])
+        if (lengths > 0).any():
+            # bound the longest segment, which bounds the search radius
+            segments = split_segments(
+                segments, 2 * np.median(lengths[lengths > 0])
+            )[0]
+        self.segments = segments
+        super().__init__((segments[:, :2] + segments[:, 2:]) / 2, "Line")
+        half_delta = (segments[:, 2:] - segments[:, :2]) / 2
+        self.half_length = {
+            2: np.hypot(*half_delta.T).max(initial=0),
+            1: np.abs(half_delta).sum(axis=1).max(initial=0)
+        }
+
+    def source_array(self, input_gdf):
+        return cntrd_array(input_gdf)
+
+    def _query(self, pnt_arr, dist_obj, workers):
+        p = dist_obj.p
+        k = min(self.N_CANDIDATES, self.size)
+        mid_dist, mid_idx = self.kdtree.query(pnt_arr, k=k, p=p,
+                                              **workers_kwarg(workers))
+        mid_dist = mid_dist.reshape(-1, k)
+        mid_idx = mid_idx.reshape(-1, k)
+        dist_arr = _segment_distance(
+            np.repeat(pnt_arr, k, axis=0), self.segments[mid_idx.ravel()], p
+        ).reshape(-1, k).min(axis=1)
+
+        # a segment whose midpoint is beyond the k nearest ones may still be
+        # closer, as long as its midpoint is within the current nearest
+        # distance plus the longest half segment length
+        half_length = self.half_length[p]
+        unresolved = np.flatnonzero(mid_dist[:, -1] - half_length < dist_arr)
+        if unresolved.size and k < self.size:
+            candidates = self.kdtree.query_ball_point(
+                pnt_arr[unresolved], dist_arr[unresolved] + half_length, p=p,
+                **workers_kwarg(workers)
+            )
+            counts = np.array([len(c) for c in candidates])
+            rows = np.repeat(unresolved, counts)
+            seg_idx = np.concatenate(candidates).astype(int)
+            np.minimum.at(dist_arr, rows, _segment_distance(
+                pnt_arr[rows], self.segments[seg_idx], p
+            ))
+        return dist_arr
+
+
+class _NetworkGraph:
+    """
+    A graph of the vertices of line geometries, connected by the segments
+    between them. Lines are connected where they share a vertex.
+    """
+
+    def __init__(self, line_gdf):
+        segments = segment_array(line_gdf)[0]
+        # vertices at the same location (within 1e-6 units) are one node
+        self.nodes, node_ids = np.unique(
+            np.round(segments.reshape(-1, 2), 6), axis=0, return_inverse=True
+        )
+        edges = np.sort(node_ids.reshape(-1, 2), axis=1)
+        lengths = np.hypot(segments[:, 2] - segments[:, 0],
+                           segments[:, 3] - segments[:, 1])
+        # a sparse matrix sums duplicated edges, keep the shortest one of
+        # overlapping segments instead
+        order = np.argsort(lengths, kind="stable")
+        edges, first = np.unique(edges[order], axis=0, return_index=True)
+        self.edge_from, self.edge_to = edges.T
+        self.edge_length = lengths[order][first]
+        self.kdtree = cKDTree(self.nodes)
+
+    @property
+    def size(self):
+        return len(self.nodes)
+
+    def snap(self, gdf, workers=1):
+        """Nearest node of each centroid, and the distance to it."""
+        snap_dist, node_ids = self.kdtree.query(cntrd_array(gdf),
+                                                **workers_kwarg(workers))
+        return node_ids, snap_dist
+
+    def distance(self, input_gdf, point_gdf, workers=1):
+        """Network distance from each input centroid to its nearest point."""
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import dijkstra
+
+        # link every node a point snaps to with a virtual source node, by the
+        # shortest snapping distance, so that one single-source pass solves
+        # the distances to the nearest point
+        target_nodes, target_snap = self.snap(point_gdf, workers)
+        link_dist = np.full(self.size, np.inf)
+        np.minimum.at(link_dist, target_nodes, target_snap)
+        linked = np.flatnonzero(np.isfinite(link_dist))
+        source = self.size
+        graph = csr_matrix(
+            (np.concatenate((self.edge_length, link_dist[linked])),
+             (np.concatenate((self.edge_from, np.full(linked.size, source))),
+              np.concatenate((self.edge_to, linked)))),
+            shape=(self.size + 1, self.size + 1)
+        )
+        node_dist = dijkstra(graph, directed=False, indices=source)
+
+        input_nodes, input_snap = self.snap(input_gdf, workers)
+        dist_arr = node_dist[input_nodes] + input_snap
+        dist_arr[~np.isfinite(dist_arr)] = np.nan
+        return dist_arr
+
+
 def _validate_target_geom(gdf, geom_type):
     gdf_manager = GeoDataFrameManager(gdf)
     assert gdf_manager.geom_type_validate(geom_type), (
         "The target geometry must be {}.".format(geom_type)
     )
 
-        
-def to_point(input_gdf, point_gdf, method='euclidean', dtype=float):
+
+def _validate_index(index, target_type):
+    if index.target_type != target_type:
+        raise ValueError(f"The DistanceIndex must be built over "
+                         f"{target_type.lower()} targets, got "
+                         f"{index.target_type.lower()}.")
+    return index
+
+
+def to_point(input_gdf, point_gdf, method='euclidean', dtype=float,
+             workers=1, chunk_size=None, k=1, return_index=False,
+             return_columns=None, network=None):
     """
     Calculate distance (euclidean or manhattan) for each geometry in the input 
     GeoDataFrame to its nearest neighbor in the point GeoDataFrame.
@@ -50,20 +517,48 @@ def to_point(input_gdf, point_gdf, method='euclidean', dtype=float):
     ----------
     input_gdf : geopandas.GeoDataFrame
         Input GeoDataFrame. Centroids of the input geometries are used.
-    point_gdf : geopandas.GeoDataFrame
+    point_gdf : geopandas.GeoDataFrame or DistanceIndex
         The GeoDataFrame contains the point geometries to which distances are
-        calculated.
+        calculated, or a DistanceIndex built by ``DistanceIndex.from_points``.
     method : str, optional
-        Method used to calculate distances. Either 'euclidean' or 'manhattan'.
+        Method used to calculate distances. Either 'euclidean', 'manhattan'
+        or 'great_circle'. 'great_circle' requires both GeoDataFrames to be in
+        a geographic (longitude, latitude) CRS and returns distances in
+        meters, without reprojecting the inputs.
     dtype : str or numpy.dtype, optional
         Use a np.dtype or Python type to cast the output distance to the
         desired type.
+    workers : int, optional, default 1
+        Number of threads used to query the nearest neighbors, -1 uses all
+        cores.
+    chunk_size : int, optional
+        Number of input geometries queried at a time, which bounds the
+        memory used by a query. By default all geometries are queried at once.
+    k : int, optional, default 1
+        Number of nearest points to find for each input feature.
+    return_index : bool, optional, default False
+        Whether to return the index labels (in point_gdf) of the nearest
+        points.
+    return_columns : str or list of str, optional
+        Columns of point_gdf whose values of the nearest points are returned.
+    network : geopandas.GeoDataFrame, optional
+        A GeoDataFrame of lines (e.g., streets) along which distances are
+        measured. Input centroids and points are snapped to the nearest
+        vertex of the network, and the snapping distances are added to the
+        network distance. The graph built from the network is kept in
+        ``index_cache`` and reused across calls. NaN is returned where no
+        point can be reached. Not supported together with k > 1,
+        return_index, return_columns or method "great_circle".
 
     Returns
     -------
-    pandas.Series
+    pandas.Series or pandas.DataFrame
         A pandas Series containing the distances of each input feature to its
-        nearest point.
+        nearest point. If k is greater than 1, or return_index or
+        return_columns is specified, a DataFrame with the columns "distance",
+        "index_right" (the index labels) and the requested columns. When k is
+        greater than 1, each column name is suffixed by the rank of the
+        neighbor, e.g., "distance_1", "distance_2".
 
     Examples
     --------
@@ -82,17 +577,76 @@ def to_point(input_gdf, point_gdf, method='euclidean', dtype=float):
     152 793.974181
     153 2279.119749
     154 500.748225
+
+    Find the two nearest schools and their enrollment:
+
+    >>> pylusat.distance.to_point(acs2016_gdf, schools_gdf, k=2,
+                                  return_index=True,
+                                  return_columns='ENROLLMENT')
+       distance_1  distance_2  index_right_1  index_right_2  ENROLLMENT_1  ENROLLMENT_2
+    0  197.284083  832.138856            113             85           0.0          88.0
+    1  721.557482  972.950079             72            113          42.0           0.0
+    ...
     """
-    target_geom = "Point"
-    _validate_target_geom(point_gdf, target_geom)
-    pnt_dist = _ArrayDistance(target_geom, method, dtype)
-    input_arr = cntrd_array(input_gdf)
-    point_arr = cntrd_array(point_gdf)
-    pnt_dist_arr = pnt_dist.query(input_arr, point_arr)
-    return Series(pnt_dist_arr, index=input_gdf.index)
+    if network is not None:
+        return _network_distance(input_gdf, point_gdf, network, method,
+                                 dtype, workers, k, return_index,
+                                 return_columns)
+
+    great_circle = method.lower() == "great_circle"
+    if great_circle:
+        _validate_geographic(input_gdf)
+    if isinstance(point_gdf, DistanceIndex):
+        pnt_index = _validate_index(point_gdf, "Point")
+        if great_circle != isinstance(pnt_index, _SphereIndex):
+            raise ValueError('method "great_circle" requires a DistanceIndex '
+                             'built with great_circle=True, and vice versa.')
+        point_gdf = pnt_index.target_gdf
+    else:
+        pnt_index = DistanceIndex.from_points(point_gdf, great_circle)
+    if k == 1 and not return_index and not return_columns:
+        pnt_dist_arr = pnt_index.query(input_gdf, method, dtype,
+                                       workers, chunk_size)
+        return Series(pnt_dist_arr, index=input_gdf.index)
+
+    dist_arr, pos_arr = pnt_index.query_neighbors(input_gdf, k, method,
+                                                  workers, chunk_size)
+    output = {"distance": dist_arr.astype(dtype)}
+    if return_index:
+        output["index_right"] = point_gdf.index.values[pos_arr]
+    if isinstance(return_columns, str):
+        return_columns = [return_columns]
+    for col in return_columns or []:
+        output[col] = point_gdf[col].values[pos_arr]
 
+    # suffix column names with the rank of the neighbor if k > 1
+    def names(name):
+        return [name] if k == 1 else [f"{name}_{i + 1}" for i in range(k)]
+    return DataFrame({col: arr[:, i]
+                      for name, arr in output.items()
+                      for i, col in enumerate(names(name))},
+                     index=input_gdf.index)
 
-def to_line(input_gdf, line_gdf, cellsize=30, method="euclidean", dtype=float):
+
+def _network_distance(input_gdf, point_gdf, network, method, dtype, workers,
+                      k, return_index, return_columns):
+    if k != 1 or return_index or return_columns or \
+            method.lower() == "great_circle":
+        raise ValueError("Network distance does not support k > 1, "
+                         "return_index, return_columns or great_circle.")
+    if isinstance(point_gdf, DistanceIndex):
+        point_gdf = _validate_index(point_gdf, "Point").target_gdf
+    else:
+        _validate_target_geom(point_gdf, "Point")
+    _validate_target_geom(network, "Line")
+    graph = _cached(("Network", GeoDataFrameManager(network).fingerprint),
+                    lambda: _NetworkGraph(network), True)
+    dist_arr = graph.distance(input_gdf, point_gdf, workers)
+    return Series(dist_arr.astype(dtype), index=input_gdf.index)
+
+
+def to_line(input_gdf, line_gdf, cellsize=30, method="euclidean", dtype=float,
+            engine="raster", workers=1, chunk_size=None):
     """
     Calculate distances from input_gdf to line_gdf.
 
@@ -100,15 +654,28 @@ def to_line(input_gdf, line_gdf, cellsize=30, method="euclidean", dtype=float):
     ----------
     input_gdf : geopandas.GeoDataFrame
         Input GeoDataFrame. Centroids of the input geometries are used.
-    line_gdf : geopandas.GeoDataFrame
-        A GeoDataFrame whose geometry is of line. 
+    line_gdf : geopandas.GeoDataFrame or DistanceIndex
+        A GeoDataFrame whose geometry is of line, or a DistanceIndex built by
+        ``DistanceIndex.from_lines``.
     cellsize : float
-        Cell size used to rasterize the line_gdf. 
+        Cell size used to rasterize the line_gdf. Ignored if line_gdf is a
+        DistanceIndex, which carries its own cell size.
     method : str, optional
         Method used to calculate distances. Either 'euclidean' or 'manhattan'.
     dtype : str or numpy.dtype, optional
         Use a np.dtype or Python type to cast the output distance to the
         desired type.
+    engine : {"raster", "vector"}, default "raster"
+        "raster" burns line_gdf into a grid of ``cellsize`` and measures the
+        distance to the nearest burned cell. "vector" measures the exact
+        distance to the nearest line segment. Ignored if line_gdf is a
+        DistanceIndex.
+    workers : int, optional, default 1
+        Number of threads used to query the nearest neighbors, -1 uses all
+        cores.
+    chunk_size : int, optional
+        Number of input geometries queried at a time, which bounds the
+        memory used by a query. By default all geometries are queried at once.
 
     Returns
     -------
@@ -117,8 +684,11 @@ def to_line(input_gdf, line_gdf, cellsize=30, method="euclidean", dtype=float):
         nearest neighbor in line_gdf.
     Notes
     -----
-    To rapidly query distances, the line_gdf is burned into numpy array by
-    using rasterize function from the rasterio package.
+    To rapidly query distances, the "raster" engine burns the line_gdf into
+    numpy array by using rasterize function from the rasterio package, so the
+    result is accurate to one cell. The "vector" engine indexes the segments
+    of the lines in a KD-tree, its memory scales with the number of vertices
+    rather than the area of the extent.
 
     Examples
     --------
@@ -138,24 +708,17 @@ def to_line(input_gdf, line_gdf, cellsize=30, method="euclidean", dtype=float):
     153 2036.909424
     154 778.845299
     """
-    target_geom = "Line"
-    _validate_target_geom(line_gdf, target_geom)
-    line_grid, _, extent, nodata = rasterize_geometry(line_gdf, cellsize)
-
-    max_y = extent[3]  # max_y from extent
-    min_x = extent[0]  # min_x from extent
-
-    input_arr = inv_affine(input_gdf, cellsize, max_y=max_y, min_x=min_x)
-    line_arr = np.argwhere(line_grid != nodata)
-
-    line_dist = _ArrayDistance("Line", method, dtype)
-    line_dist_arr = line_dist.query(input_arr, line_arr) * cellsize
-
+    if isinstance(line_gdf, DistanceIndex):
+        line_index = _validate_index(line_gdf, "Line")
+    else:
+        line_index = DistanceIndex.from_lines(line_gdf, cellsize, engine)
+    line_dist_arr = line_index.query(input_gdf, method, dtype,
+                                     workers, chunk_size)
     return Series(line_dist_arr, index=input_gdf.index)
 
 
-def to_cell(input_gdf, raster, value, nodata=None,
-            method="euclidean", dtype=float):
+def to_cell(input_gdf, raster, value=None, nodata=None,
+            method="euclidean", dtype=float, workers=1, chunk_size=None):
     """
     Calculate distance for each geometry to its nearest-neighbor cell that has
     a specific value.
@@ -164,11 +727,14 @@ def to_cell(input_gdf, raster, value, nodata=None,
     ----------
     input_gdf : geopandas.GeoDataFrame
         Input GeoDataFrame
-    raster : str
-        A path to a tif file or a connection string to a raster on PostgreSQL.
-    value : int or float
+    raster : str or DistanceIndex
+        A path to a tif file or a connection string to a raster on PostgreSQL,
+        or a DistanceIndex built by ``DistanceIndex.from_raster``.
+    value : int or float, or list of int or float
         Cells in the raster with this value will be used as targets for
-        distance calculation.
+        distance calculation. If a list is given, distances to the cells of
+        each value are calculated from a single pass over the raster. Not
+        needed if raster is a DistanceIndex.
     nodata : int or float
         Value for no data cells.
     method : str, optional, default "euclidean"
@@ -176,12 +742,25 @@ def to_cell(input_gdf, raster, value, nodata=None,
     dtype : str or numpy.dtype, optional
         Use a numpy.dtype or Python type to cast the output distance to the
         desired type.
+    workers : int, optional, default 1
+        Number of threads used to query the nearest neighbors, -1 uses all
+        cores.
+    chunk_size : int, optional
+        Number of input geometries queried at a time, which bounds the
+        memory used by a query. By default all geometries are queried at once.
 
     Returns
     -------
-    pandas.Series
+    pandas.Series or pandas.DataFrame
         A pandas Series of distances from each feature in input_gdf to the
-        nearest cell (has the specified value) in the raster dataset.
+        nearest cell (has the specified value) in the raster dataset. If
+        value is a list, a DataFrame with one column of distances per value.
+
+    Notes
+    -----
+    The raster is read block by block (following its internal tiling) and
+    only the indices of the target cells are kept, so the whole band is never
+    loaded into memory.
 
     Examples
     --------
@@ -200,17 +779,290 @@ def to_cell(input_gdf, raster, value, nodata=None,
     152 9688.188685
     153 4740.854353
     154 4250.799925    
+
+    Calculate distances to the cells of several habitat classes at once.
+
+    >>> pylusat.distance.to_cell(acs2016_gdf, habitat_shift_tif, [6, 7, 8])
+                  6           7           8
+    0   4789.676398    0.000000   30.000000
+    1   3676.805679  174.928557  384.187454
+    2   5509.065256  241.867732  182.482876
+    3   3059.411708  108.166538  450.000000
+    4   2670.674072  161.554944  192.093727
+    ...
     """
-    rast_manager = RasterManager.from_path(raster, nodata)
-    rast_arr, cellsize, max_y, min_x, nodata = rast_manager.as_rebuild_info()
-    rast_arr_filtered = np.argwhere(rast_arr == value)
+    if isinstance(raster, DistanceIndex):
+        rast_index = _validate_index(raster, "Raster")
+    elif value is None:
+        raise ValueError("value must be specified to select target cells.")
+    elif isinstance(value, (list, tuple, np.ndarray)):
+        rast_indexes = DistanceIndex.from_raster_values(raster, value, nodata)
+        return DataFrame({
+            v: index.query(input_gdf, method, dtype, workers, chunk_size)
+            for v, index in rast_indexes.items()
+        }, index=input_gdf.index)
+    else:
+        rast_index = DistanceIndex.from_raster(raster, value, nodata)
     # if raster does not contain any specified value return null for each row
-    if rast_arr_filtered.size == 0:
-        return Series(np.nan, index=input_gdf.index)
-
-    input_centroid_arr = inv_affine(input_gdf, cellsize, max_y, min_x)
-    rast_dist_obj = _ArrayDistance("Raster", method, dtype)
-    rast_dist = (
-        rast_dist_obj.query(input_centroid_arr, rast_arr_filtered) * cellsize
-    )
+    rast_dist = rast_index.query(input_gdf, method, dtype,
+                                 workers, chunk_size)
     return Series(rast_dist, index=input_gdf.index)
+
+
+def surface(target, cellsize=30, value=None, nodata=None,
+            method="euclidean", extent=None, dtype="float32"):
+    """
+    Calculate a raster of the distance from every cell to its nearest target.
+
+    Parameters
+    ----------
+    target : geopandas.GeoDataFrame or str
+        A GeoDataFrame whose geometries are burned into a grid as targets, or
+        a path to a tif file whose cells with ``value`` are targets.
+    cellsize : float, optional
+        Cell size of the output raster. Ignored if target is a raster, which
+        determines the grid of the output.
+    value : int or float, optional
+        Cells in the target raster with this value will be used as targets.
+        Required if target is a raster.
+    nodata : int or float
+        Value for no data cells of the target raster.
+    method : str, optional, default "euclidean"
+        Method used to calculate distances. Either 'euclidean' or 'manhattan'.
+    extent : tuple, optional
+        ``(min_x, min_y, max_x, max_y)`` of the output raster if target is a
+        GeoDataFrame. Defaults to the total bounds of target.
+    dtype : str or numpy.dtype, optional, default "float32"
+        Data type of the output raster.
+
+    Returns
+    -------
+    rasterio.io.DatasetReader
+        A raster dataset (opened from a rasterio ``MemoryFile``) whose cells
+        contain the distance to the nearest target cell, in the unit of the
+        target's coordinate system. All cells are NaN if there is no target.
+
+    Notes
+    -----
+    Distances are computed with exact, linear-time distance transforms of the
+    target mask, ``scipy.ndimage.distance_transform_edt`` for euclidean and
+    ``scipy.ndimage.distance_transform_cdt`` with the taxicab metric for
+    manhattan distance.
+
+    Examples
+    --------
+    Calculate the distance to highways for every 30 meter cell covering the
+    census block groups.
+
+    >>> dist_ds = pylusat.distance.surface(highway_gdf, cellsize=30,
+                                           extent=acs2016_gdf.total_bounds)
+    >>> dist_ds.read(1)
+    array([[ 9837.851 ,  9808.67  , ..., 15888.703 , 15909.902 ],
+           [ 9830.941 ,  9801.739 , ..., 15867.477 , 15888.703 ],
+           ...,
+           [17729.264 , 17705.719 , ...,  5738.0835,  5766.0127],
+           [17747.86  , 17724.34  , ...,  5749.1304,  5777.0063]],
+          dtype=float32)
+    """
+    from scipy import ndimage
+
+    if isinstance(target, GeoDataFrame):
+        target_grid, affine, _, fill = rasterize_geometry(target, cellsize,
+                                                          extent=extent)
+        target_mask = target_grid != fill
+        crs = target.crs
+    elif value is None:
+        raise ValueError("value must be specified to select target cells.")
+    else:
+        rast_manager = RasterManager(target, nodata)
+        target_mask = rast_manager.to_array() == value
+        affine = rast_manager.get_affine()
+        cellsize = affine[0]
+        crs = rast_manager.get_rio_crs()
+
+    if not target_mask.any():
+        dist_arr = np.full(target_mask.shape, np.nan, dtype=dtype)
+    elif method.lower() == "manhattan":
+        dist_arr = ndimage.distance_transform_cdt(~target_mask,
+                                                  metric="taxicab")
+        dist_arr = (dist_arr * cellsize).astype(dtype)
+    else:
+        dist_arr = ndimage.distance_transform_edt(~target_mask,
+                                                  sampling=cellsize)
+        dist_arr = dist_arr.astype(dtype)
+    return write_raster(dist_arr, affine, crs,
+                        nodata=np.nan if np.issubdtype(dist_arr.dtype,
+                                                       np.floating) else None)
+
+
+def _grid_graph(friction, valid, res_x, res_y, connectivity=8,
+                chunk_rows=256):
+    """Directed graph of the valid cells of a friction surface, with an edge
+    in both directions between adjacent cells, whose weight is the cost of
+    moving between their centers.
+
+    The CSR matrix is filled in place chunk by chunk of rows, with int32
+    indices (as ``scipy.sparse.csgraph`` uses), so the only temporaries are
+    those of one chunk."""
+    from scipy.sparse import csr_matrix
+
+    n_rows, n_cols = friction.shape
+    # the neighbors in the order of their cell ids, so the rows are sorted
+    offsets = [(-1, 0, res_y), (0, -1, res_x), (0, 1, res_x), (1, 0, res_y)]
+    if connectivity == 8:
+        diagonal = np.hypot(res_x, res_y)
+        offsets = [(-1, -1, diagonal)] + offsets[:1] + \
+            [(-1, 1, diagonal)] + offsets[1:3] + \
+            [(1, -1, diagonal)] + offsets[3:] + [(1, 1, diagonal)]
+
+    def shifted(row_start, row_stop, d_row, d_col):
+        # the cells of the rows and their neighbors at the offset in the grid
+        rows = slice(max(row_start, -d_row), min(row_stop, n_rows - d_row))
+        cols = slice(max(-d_col, 0), n_cols - max(d_col, 0))
+        return (rows, cols), (slice(rows.start + d_row, rows.stop + d_row),
+                              slice(cols.start + d_col, cols.stop + d_col))
+
+    n_edges = np.zeros(friction.shape, dtype=np.uint8)
+    for d_row, d_col, _ in offsets:
+        src, dst = shifted(0, n_rows, d_row, d_col)
+        n_edges[src] += valid[src] & valid[dst]
+    index_dtype = np.int32 if friction.size * len(offsets) < 2 ** 31 \
+        else np.int64
+    indptr = np.zeros(friction.size + 1, dtype=index_dtype)
+    np.cumsum(n_edges, out=indptr[1:])
+    del n_edges
+    indices = np.empty(indptr[-1], dtype=index_dtype)
+    costs = np.empty(indptr[-1])
+
+    for row_start in range(0, n_rows, chunk_rows):
+        row_stop = min(row_start + chunk_rows, n_rows)
+        # the next position to fill in the row of each cell of the chunk
+        cursor = indptr[row_start * n_cols:row_stop * n_cols].reshape(
+            -1, n_cols).astype(np.int64)
+        for d_row, d_col, step in offsets:
+            src, dst = shifted(row_start, row_stop, d_row, d_col)
+            if src[0].start >= src[0].stop:
+                continue
+            both_valid = valid[src] & valid[dst]
+            chunk_cursor = cursor[src[0].start - row_start:
+                                  src[0].stop - row_start, src[1]]
+            pos = chunk_cursor[both_valid]
+            dst_rows, dst_cols = np.nonzero(both_valid)
+            indices[pos] = (dst_rows + dst[0].start) * n_cols + \
+                dst_cols + dst[1].start
+            costs[pos] = (friction[src][both_valid].astype(np.float64) +
+                          friction[dst][both_valid]) / 2 * step
+            chunk_cursor[both_valid] += 1
+    return csr_matrix((costs, indices, indptr),
+                      shape=(friction.size, friction.size))
+
+
+def _match_crs(gdf, rio_crs):
+    # reproject gdf to the CRS of a raster if they are different
+    if gdf.crs.to_epsg() != rio_crs.to_epsg():
+        return gdf.to_crs(rio_crs.to_wkt())
+    return gdf
+
+
+def cost_distance(source_gdf, friction_raster, input_gdf=None,
+                  connectivity=8, nodata=None, dtype="float32"):
+    """
+    Calculate the least accumulated cost of traveling from every cell of a
+    friction surface to its nearest (cheapest) source.
+
+    Parameters
+    ----------
+    source_gdf : geopandas.GeoDataFrame
+        The sources, which are burned into the grid of the friction raster.
+        Every cell touched by a source geometry is a source cell.
+    friction_raster : str
+        A path to a tif file whose cell values are the cost of traveling one
+        unit of distance through the cells. Cells of no data or negative
+        values are impassable.
+    input_gdf : geopandas.GeoDataFrame, optional
+        If specified, the accumulated cost at the centroid of each geometry
+        is returned.
+    connectivity : {8, 4}, default 8
+        Whether to travel to the 8 (including diagonal) or 4 adjacent cells.
+    nodata : int or float
+        Value for no data cells of the friction raster.
+    dtype : str or numpy.dtype, optional, default "float32"
+        Data type of the output cost surface.
+
+    Returns
+    -------
+    cost_ds : rasterio.io.DatasetReader
+        A raster dataset (opened from a rasterio ``MemoryFile``) of the
+        accumulated cost. Cells that are impassable or cannot reach any source
+        are NaN.
+    cost_sr : pandas.Series or None
+        The accumulated cost at each feature of input_gdf, None if input_gdf
+        is not specified.
+
+    Notes
+    -----
+    The cost of moving between two adjacent cells is the mean of their
+    friction times the distance between their centers. All cells are solved
+    with a single multi-source Dijkstra pass by
+    ``scipy.sparse.csgraph.dijkstra``, which runs in O(E log V) for V cells
+    and E (up to 8V) directed edges. The graph is held in memory as a sparse
+    matrix with int32 indices, and the peak memory, including the graph, the
+    band and the output, is about 100 bytes per cell for 8-connectivity (65
+    bytes for 4-connectivity), e.g., 10 GB for 10^8 cells.
+
+    Examples
+    --------
+    Calculate the cost of traveling from schools across a friction surface,
+    and the cost at the centroids of the census block groups.
+
+    >>> cost_ds, cost_sr = pylusat.distance.cost_distance(
+            schools_gdf, friction_tif, input_gdf=acs2016_gdf
+        )
+    """
+    from rasterio import features
+    from scipy.sparse.csgraph import dijkstra
+
+    if connectivity not in (4, 8):
+        raise ValueError("connectivity must be either 4 or 8.")
+    rast_manager = RasterManager(friction_raster, nodata)
+    # the band is kept in its own data type, only the edges are float64
+    friction = rast_manager.to_array()
+    rast_nodata = rast_manager.rast_ds.nodata if nodata is None else nodata
+    valid = friction >= 0
+    if np.issubdtype(friction.dtype, np.floating):
+        valid &= np.isfinite(friction)
+    if rast_nodata is not None:
+        valid &= friction != rast_nodata
+    affine = rast_manager.get_affine()
+    rast_crs = rast_manager.get_rio_crs()
+
+    source_gdf = _match_crs(source_gdf, rast_crs)
+    source_mask = features.rasterize(
+        source_gdf.geometry, out_shape=friction.shape, transform=affine,
+        fill=0, default_value=1, all_touched=True, dtype="uint8"
+    ).astype(bool)
+    source_ids = np.flatnonzero(source_mask & valid)
+
+    if source_ids.size:
+        graph = _grid_graph(friction, valid, affine[0], -affine[4],
+                            connectivity)
+        # the edges go both ways, so scipy needs no transposed copy
+        cost_arr = dijkstra(graph, directed=True, indices=source_ids,
+                            min_only=True).reshape(friction.shape)
+        del graph
+    else:
+        cost_arr = np.full(friction.shape, np.inf)
+    cost_arr[~np.isfinite(cost_arr)] = np.nan
+    cost_ds = write_raster(cost_arr.astype(dtype), affine, rast_crs,
+                           nodata=np.nan)
+
+    if input_gdf is None:
+        return cost_ds, None
+    # the cells in which the centroids fall
+    cols, rows = ~affine * cntrd_array(_match_crs(input_gdf, rast_crs)).T
+    rows, cols = np.floor(rows).astype(int), np.floor(cols).astype(int)
+    inside = ((rows >= 0) & (rows < friction.shape[0]) &
+              (cols >= 0) & (cols < friction.shape[1]))
+    cost_sr = Series(np.nan, index=input_gdf.index)
+    cost_sr[inside] = cost_arr[rows[inside], cols[inside]]
+    return cost_ds, cost_sr
@@ -1,11 +1,14 @@
 import numpy as np
 from scipy.spatial import cKDTree
 from pandas import Series
-from pylusat.utils import cntrd_array
+from pylusat.base import GeoDataFrameManager
+from pylusat.utils import cntrd_array, iter_chunks, workers_kwarg
+from pylusat.utils import sphere_array, arc_to_chord, chord_to_arc
 
 
 def idw(input_gdf, value_gdf, value_clm, power=2, n_neighbor=12,
-        search_radius=None, leafsize=14, min_dist=1e-12, dtype=float):
+        search_radius=None, leafsize=14, min_dist=1e-12, dtype=float,
+        workers=1, chunk_size=None, method="euclidean"):
     """
     Interpolation using inverse distance weighting (IDW).
 
@@ -40,6 +43,17 @@ def idw(input_gdf, value_gdf, value_clm, power=2, n_neighbor=12,
     dtype : str or numpy.dtype, optional
         Use a np.dtype or Python type to cast the interpolated values to the
         desired type.
+    workers : int, optional, default 1
+        Number of threads used to query the nearest neighbors, -1 uses all
+        cores.
+    chunk_size : int, optional
+        Number of input geometries interpolated at a time, which bounds the
+        memory used by the neighbor query. By default all geometries are
+        interpolated at once.
+    method : {"euclidean", "great_circle"}, optional
+        Method used to calculate distances. 'great_circle' requires both
+        GeoDataFrames to be in a geographic (longitude, latitude) CRS, in
+        which case search_radius and min_dist are in meters.
 
     Returns
     -------
@@ -73,36 +87,62 @@ def idw(input_gdf, value_gdf, value_clm, power=2, n_neighbor=12,
         raise ValueError("n_neighbor must be a positive integer that is less "
                          "than or equal to the number of rows in value_gdf.")
 
+    great_circle = method.lower() == "great_circle"
+    if great_circle and not all(
+        GeoDataFrameManager(gdf).geom_unit_id == "degree"
+        for gdf in (input_gdf, value_gdf)
+    ):
+        raise ValueError('method "great_circle" requires GeoDataFrames in a '
+                         'geographic (longitude, latitude) CRS.')
+    # points on the unit sphere, whose chord lengths convert to great circle
+    # distances
+    coords = sphere_array if great_circle else cntrd_array
+
     value_gdf = value_gdf.reset_index(drop=True)
-    value_coords = cntrd_array(value_gdf)
+    value_coords = coords(value_gdf)
     kdtree = cKDTree(value_coords, leafsize=leafsize)
 
     if not search_radius:
         search_radius = np.inf
-    dd: np.ndarray
-    ii: np.ndarray
-    dd, ii = kdtree.query(cntrd_array(input_gdf), k=n_neighbor,
-                          distance_upper_bound=search_radius)
-
-    if n_neighbor == 1:
-        return value_gdf[value_clm][ii]
+    elif great_circle:
+        search_radius = arc_to_chord(search_radius)
     if dtype is None:
         dtype = value_gdf[value_clm].dtype
-
-    n = len(input_gdf.index)
-    output_arr = np.zeros(n, dtype=dtype)
     if min_dist <= 0:
         min_dist = 1e-12
 
-    for j in range(n):
-        within_min = (dd[j] <= min_dist)
-        if np.any(within_min):
-            output_arr[j] = value_gdf[value_clm][ii[j][within_min][0]]
+    n = len(input_gdf.index)
+    # neighbors missing within search_radius have an index equal to the
+    # number of points, which picks the padded zero and gets a zero weight
+    value_arr = np.append(value_gdf[value_clm].values, 0)
+    if n_neighbor == 1:
+        ii_arr = np.empty(n, dtype=int)
+    else:
+        output_arr = np.zeros(n, dtype=dtype)
+
+    dd: np.ndarray
+    ii: np.ndarray
+    for start, stop in iter_chunks(n, chunk_size):
+        dd, ii = kdtree.query(coords(input_gdf.iloc[start:stop]),
+                              k=n_neighbor,
+                              distance_upper_bound=search_radius,
+                              **workers_kwarg(workers))
+        if n_neighbor == 1:
+            ii_arr[start:stop] = ii
             continue
+        if great_circle:
+            dd = chord_to_arc(dd)
 
-        w = 1 / dd[j]**power
-        output_arr[j] = np.dot(w, value_gdf[value_clm][ii[j]]) / np.sum(w)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w = 1 / dd**power
+            chunk_arr = (w * value_arr[ii]).sum(axis=1) / w.sum(axis=1)
+        # neighbors are sorted by distance, so only the closest one is checked
+        within_min = dd[:, 0] <= min_dist
+        chunk_arr[within_min] = value_arr[ii[within_min, 0]]
+        output_arr[start:stop] = chunk_arr
 
+    if n_neighbor == 1:
+        return value_gdf[value_clm][ii_arr]
     output_sr = Series(output_arr, index=input_gdf.index)
     return output_sr
 
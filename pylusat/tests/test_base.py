@@ -2,6 +2,7 @@ from pylusat.datasets import get_path
 from pylusat.base import RasterManager
 import pytest
 import math
+import numpy as np
 
 
 @pytest.fixture
@@ -31,3 +32,11 @@ def test_raster_manager(habitat_tif, habitat_shift_tif):
     rio_obj_match_2 = rast_manager_2.match_extent(rast_manager_1)
     assert rio_obj_match_1.transform[2] == rio_obj_match_2.transform[2]
     assert rio_obj_match_1.transform[5] == rio_obj_match_2.transform[5]
+
+
+def test_raster_manager_argwhere(habitat_shift_tif):
+    rast_manager = RasterManager.from_path(habitat_shift_tif)
+    expected = np.argwhere(rast_manager.to_array() == 6)
+    result = rast_manager.argwhere(6)
+    assert len(result) == len(expected) == 115
+    assert set(map(tuple, result)) == set(map(tuple, expected))
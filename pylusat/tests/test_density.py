@@ -1,6 +1,9 @@
+import numpy as np
 import geopandas as gpd
-from pylusat.density import of_point, of_line
+from shapely.geometry import Point, Polygon
+from pylusat.density import of_point, of_line, kernel_surface
 from pylusat.datasets import get_path
+from pylusat.geotools import gridify
 import pytest
 
 
@@ -35,3 +38,108 @@ def test_of_line(acs2016_gdf, highway_gdf):
                      search_radius='1 mile',
                      area_unit='square mile')
     assert round(result[0], 4) == 0.0004
+
+
+def test_of_point_engine(acs2016_gdf, schools_gdf):
+    result = of_point(acs2016_gdf, schools_gdf, "ENROLLMENT", '1 mile',
+                      'square mile', engine='sindex')
+    expected = of_point(acs2016_gdf, schools_gdf, "ENROLLMENT", '1 mile',
+                        'square mile', engine='sjoin')
+    assert result.round(10).equals(expected.round(10))
+    # missing values of the population column are skipped
+    schools_gdf.loc[schools_gdf.index[:20], "ENROLLMENT"] = np.nan
+    for search_radius in (None, '1 mile', ['0.5 mile', '1 mile']):
+        result = of_point(acs2016_gdf, schools_gdf, "ENROLLMENT",
+                          search_radius, 'square mile', engine='sindex')
+        expected = of_point(acs2016_gdf, schools_gdf, "ENROLLMENT",
+                            search_radius, 'square mile', engine='sjoin')
+        assert not result.isna().any(axis=None)
+        assert result.values == pytest.approx(expected.values)
+
+
+def test_of_point_kdtree(acs2016_gdf, schools_gdf):
+    centroid_gdf = acs2016_gdf.copy()
+    centroid_gdf.geometry = acs2016_gdf.centroid
+    result = of_point(centroid_gdf, schools_gdf, "ENROLLMENT", '1 mile',
+                      'square mile', engine='kdtree')
+    expected = of_point(centroid_gdf, schools_gdf, "ENROLLMENT", '1 mile',
+                        'square mile', engine='sindex')
+    # buffers approximate the area of the search circle
+    assert ((result - expected).abs() <= expected * 0.002).all()
+
+
+def test_of_line_vector(acs2016_gdf, highway_gdf):
+    result = of_line(acs2016_gdf, highway_gdf, search_radius='1 mile',
+                     area_unit='square mile', engine='vector')
+    assert round(result[0], 6) == 0.000486
+    result = of_line(acs2016_gdf, highway_gdf, engine='vector')
+    highway = highway_gdf.unary_union
+    polygon = acs2016_gdf.geometry[2]
+    assert result[2] * polygon.area == pytest.approx(
+        polygon.intersection(highway).length
+    )
+
+
+def test_kernel_surface(schools_gdf):
+    density_ds = kernel_surface(schools_gdf, 100, '1 mile',
+                                weight_clm='ENROLLMENT')
+    density_arr = density_ds.read(1)
+    assert density_arr.shape == (497, 540)
+    # the kernel integrates to one, the density sums to the total weight
+    assert density_arr.sum() * 100 ** 2 == pytest.approx(
+        schools_gdf['ENROLLMENT'].sum(), rel=1e-4
+    )
+
+
+def test_of_point_multi_radius(acs2016_gdf, schools_gdf):
+    # a radius gives the same densities whether it is the largest or not
+    radii = ['1 mile', '0.5 mile', '2 mile']
+    for engine in ('kdtree', 'sindex'):
+        result = of_point(acs2016_gdf, schools_gdf, "ENROLLMENT", radii,
+                          'square mile', engine=engine)
+        assert list(result.columns) == radii
+        for radius in radii:
+            expected = of_point(acs2016_gdf, schools_gdf, "ENROLLMENT",
+                                radius, 'square mile', engine=engine)
+            assert result[radius].values == pytest.approx(expected.values)
+
+
+def test_of_point_multi_radius_buffer():
+    # a point within 1 mile of the input, but outside its buffer polygon,
+    # between two vertices that approximate the circle
+    angle = np.radians(90 / 16 / 2)
+    dist = 1609.344 * 0.9995
+    input_gdf = gpd.GeoDataFrame(geometry=[Point(0, 0)], crs='EPSG:3087')
+    point_gdf = gpd.GeoDataFrame(
+        geometry=[Point(dist * np.cos(angle), dist * np.sin(angle))],
+        crs='EPSG:3087'
+    )
+    expected = of_point(input_gdf, point_gdf, search_radius='1 mile',
+                        area_unit='square mile')
+    for radii in (['0.5 mile', '1 mile'], ['1 mile', '2 mile']):
+        result = of_point(input_gdf, point_gdf, search_radius=radii,
+                          area_unit='square mile')
+        assert result['1 mile'].values == pytest.approx(expected.values)
+
+
+def test_of_line_multi_radius(acs2016_gdf, highway_gdf):
+    radii = ['0.5 mile', '1 mile']
+    result = of_line(acs2016_gdf, highway_gdf, search_radius=radii,
+                     area_unit='square mile', engine='vector')
+    assert round(result['1 mile'][0], 6) == 0.000486
+    expected = of_line(acs2016_gdf, highway_gdf, search_radius='0.5 mile',
+                       area_unit='square mile', engine='vector')
+    assert result['0.5 mile'].values == pytest.approx(expected.values)
+
+
+def test_of_line_sat(highway_gdf):
+    grid_gdf = gridify(highway_gdf, cell_x=3000)
+    result = of_line(grid_gdf, highway_gdf, engine='sat')
+    expected = of_line(grid_gdf, highway_gdf)
+    assert result.values == pytest.approx(expected.fillna(0).values)
+    # a polygon is summed and divided by the area of its bounding box
+    triangle_gdf = grid_gdf.copy()
+    triangle_gdf['geometry'] = [Polygon([(x0, y0), (x1, y0), (x0, y1)])
+                                for x0, y0, x1, y1 in grid_gdf.bounds.values]
+    triangle_result = of_line(triangle_gdf, highway_gdf, engine='sat')
+    assert triangle_result.values == pytest.approx(result.values)
@@ -1,5 +1,8 @@
 import geopandas as gpd
+import numpy as np
 from pylusat.distance import to_point, to_line, to_cell
+from pylusat.distance import DistanceIndex, index_cache, surface
+from pylusat.distance import cost_distance
 from pylusat.datasets import get_path
 import pytest
 
@@ -19,11 +22,21 @@ def highway_gdf():
     return gpd.read_file(get_path("highway"))
 
 
+@pytest.fixture
+def streets_gdf():
+    return gpd.read_file(get_path("streets"))
+
+
 @pytest.fixture
 def habitat_tif():
     return get_path("habitat")
 
 
+@pytest.fixture
+def habitat_shift_tif():
+    return get_path("habitat_shift")
+
+
 def test_to_point(acs2016_gdf, schools_gdf):
     result = to_point(acs2016_gdf, schools_gdf)
 
@@ -36,3 +49,107 @@ def test_to_line(acs2016_gdf, highway_gdf):
 def test_to_cell(acs2016_gdf, habitat_tif):
     result = to_cell(acs2016_gdf, habitat_tif, 6)
     assert round(result[0], 4) == 5825.4099
+
+
+def test_distance_index(acs2016_gdf, schools_gdf, highway_gdf):
+    index_cache.clear()
+    schools_idx = DistanceIndex.from_points(schools_gdf)
+    assert DistanceIndex.from_points(schools_gdf).kdtree is schools_idx.kdtree
+    assert to_point(acs2016_gdf, schools_idx).equals(
+        to_point(acs2016_gdf, schools_gdf)
+    )
+    highway_idx = DistanceIndex.from_lines(highway_gdf, cellsize=30)
+    assert round(to_line(acs2016_gdf, highway_idx)[0], 4) == 715.6116
+    assert len(index_cache) == 2
+    with pytest.raises(ValueError):
+        to_line(acs2016_gdf, schools_idx)
+
+
+def test_distance_index_attributes(acs2016_gdf, schools_gdf):
+    index_cache.clear()
+    DistanceIndex.from_points(schools_gdf)
+    # same geometries, other attributes and index labels
+    scenario_gdf = schools_gdf.copy()
+    scenario_gdf['ENROLLMENT'] += 1000
+    scenario_gdf.index += 500
+    scenario_idx = DistanceIndex.from_points(scenario_gdf)
+    assert len(index_cache) == 1
+    result = to_point(acs2016_gdf, scenario_idx, return_index=True,
+                      return_columns='ENROLLMENT')
+    expected = to_point(acs2016_gdf, scenario_gdf, return_index=True,
+                        return_columns='ENROLLMENT')
+    assert result.equals(expected)
+    assert (result['index_right'] >= 500).all()
+
+
+def test_to_line_vector(acs2016_gdf, highway_gdf):
+    result = to_line(acs2016_gdf, highway_gdf, engine="vector")
+    highway = highway_gdf.unary_union
+    assert result[0] == pytest.approx(highway.distance(acs2016_gdf.centroid[0]))
+    assert round(result[0], 4) == 692.7728
+
+
+def test_surface(acs2016_gdf, highway_gdf):
+    dist_ds = surface(highway_gdf, cellsize=30,
+                      extent=acs2016_gdf.total_bounds)
+    assert dist_ds.shape == (1939, 1967)
+    assert dist_ds.read(1).min() == 0
+    assert round(float(dist_ds.read(1)[0, 0]), 2) == 9837.85
+
+
+def test_to_cell_index(acs2016_gdf, habitat_shift_tif):
+    habitat_idx = DistanceIndex.from_raster(habitat_shift_tif, 6)
+    assert habitat_idx.size == 115
+    result = to_cell(acs2016_gdf, habitat_idx)
+    assert round(result[0], 4) == 4789.6764
+
+
+def test_to_point_chunked(acs2016_gdf, schools_gdf):
+    result = to_point(acs2016_gdf, schools_gdf, workers=-1, chunk_size=50)
+    assert result.equals(to_point(acs2016_gdf, schools_gdf))
+
+
+def test_to_cell_values(acs2016_gdf, habitat_shift_tif):
+    index_cache.clear()
+    result = to_cell(acs2016_gdf, habitat_shift_tif, [6, 7, 8])
+    assert list(result.columns) == [6, 7, 8]
+    assert round(result.loc[0, 6], 4) == 4789.6764
+    assert round(result.loc[1, 8], 4) == 384.1875
+
+
+def test_to_point_neighbors(acs2016_gdf, schools_gdf):
+    result = to_point(acs2016_gdf, schools_gdf, k=2, return_index=True,
+                      return_columns="ENROLLMENT")
+    assert list(result.columns) == ["distance_1", "distance_2",
+                                    "index_right_1", "index_right_2",
+                                    "ENROLLMENT_1", "ENROLLMENT_2"]
+    assert round(result.loc[0, "distance_1"], 4) == 197.2841
+    assert result.loc[1, "index_right_1"] == 72
+    assert result.loc[1, "ENROLLMENT_1"] == 42
+    assert (result["distance_1"] <= result["distance_2"]).all()
+
+
+def test_to_point_great_circle(acs2016_gdf, schools_gdf):
+    result = to_point(acs2016_gdf.to_crs(4326), schools_gdf.to_crs(4326),
+                      method="great_circle")
+    assert round(result[0], 4) == 197.4598
+    with pytest.raises(ValueError):
+        to_point(acs2016_gdf, schools_gdf, method="great_circle")
+
+
+def test_cost_distance(acs2016_gdf, schools_gdf, habitat_shift_tif):
+    cost_ds, cost_sr = cost_distance(schools_gdf, habitat_shift_tif,
+                                     input_gdf=acs2016_gdf)
+    assert cost_ds.shape == (1940, 1968)
+    assert np.nanmin(cost_ds.read(1)) == 0
+    assert round(cost_sr[0], 4) == 1591.4318
+    _, cost_sr_4 = cost_distance(schools_gdf, habitat_shift_tif,
+                                 input_gdf=acs2016_gdf, connectivity=4)
+    assert (cost_sr_4.dropna() >= cost_sr.dropna()).all()
+
+
+def test_to_point_network(acs2016_gdf, schools_gdf, streets_gdf):
+    result = to_point(acs2016_gdf, schools_gdf, network=streets_gdf)
+    assert round(result[0], 4) == 914.654
+    straight = to_point(acs2016_gdf, schools_gdf)
+    assert (result.dropna() >= straight[result.notna()]).all()
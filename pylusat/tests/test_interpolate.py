@@ -18,3 +18,16 @@ def test_idw(acs2016_gdf, schools_gdf):
     idw_result = idw(acs2016_gdf, schools_gdf, 'ENROLLMENT',
                      power=2.00, n_neighbor=12)
     assert round(idw_result[0], 4) == 26.4073
+
+
+def test_idw_chunked(acs2016_gdf, schools_gdf):
+    idw_result = idw(acs2016_gdf, schools_gdf, 'ENROLLMENT',
+                     power=2.00, n_neighbor=12, workers=2, chunk_size=50)
+    assert round(idw_result[0], 4) == 26.4073
+
+
+def test_idw_great_circle(acs2016_gdf, schools_gdf):
+    idw_result = idw(acs2016_gdf.to_crs(4326), schools_gdf.to_crs(4326),
+                     'ENROLLMENT', power=2.00, n_neighbor=12,
+                     method='great_circle')
+    assert round(idw_result[0], 4) == 26.4359
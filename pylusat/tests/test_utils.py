@@ -1 +1,10 @@
 # test functions for utils module
+import numpy as np
+from scipy.spatial import cKDTree
+from pylusat.utils import workers_kwarg
+
+
+def test_workers_kwarg():
+    kdtree = cKDTree(np.array([[0., 0.], [3., 4.]]))
+    dist, _ = kdtree.query(np.array([[0., 1.]]), **workers_kwarg(2))
+    assert dist[0] == 1
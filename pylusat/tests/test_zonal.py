@@ -1,6 +1,10 @@
 import geopandas as gpd
-from pylusat.zonal import zonal_stats_raster
+import numpy as np
+from pylusat.zonal import zonal_stats_raster, tabulate
+from pylusat.zonal import _QuantileSketch, _ClassAccumulator, _tile_shape
 import pytest
+import rasterio
+from rasterio.shutil import copy as rio_copy
 from pylusat.datasets import get_path
 
 
@@ -14,6 +18,11 @@ def habitat_tif():
     return get_path("habitat")
 
 
+@pytest.fixture
+def habitat_shift_tif():
+    return get_path("habitat_shift")
+
+
 @pytest.fixture
 def habitat_fl_stateplane_tif():
     return get_path("habitat_fl_stateplane")
@@ -33,3 +42,245 @@ def test_zonal_stats_raster_diff_proj(acs2016_gdf, habitat_fl_stateplane_tif):
     assert round(zonal_result.iloc[0, -2], 4) == 32.1544
     assert zonal_result.iloc[0, -3] == 42
     assert zonal_result.iloc[0, -4] == 7
+
+
+def test_zonal_stats_raster_label(acs2016_gdf, habitat_shift_tif):
+    stats = ['count', 'sum', 'mean', 'min', 'max', 'std', 'range']
+    # the raster covers part of the zones, cells outside it are nodata
+    expected = zonal_stats_raster(acs2016_gdf.copy(), habitat_shift_tif,
+                                  stats=stats, nodata=255)
+    zonal_result = zonal_stats_raster(acs2016_gdf, habitat_shift_tif,
+                                      stats=stats, nodata=255, engine='label')
+    assert zonal_result['zonal_count'][0] == 1303
+    assert round(zonal_result['zonal_mean'][0], 4) == 14.4988
+    for stat in stats:
+        column = f'zonal_{stat}'
+        assert zonal_result[column].values == pytest.approx(
+            expected[column].astype(float).values, nan_ok=True
+        )
+    with pytest.raises(ValueError):
+        zonal_stats_raster(acs2016_gdf, habitat_shift_tif,
+                           stats='majority', engine='label')
+
+
+@pytest.fixture
+def habitat_striped_tif(habitat_shift_tif, tmp_path):
+    # GDAL's default layout, one strip of a few full-width rows per block
+    striped_tif = str(tmp_path / 'habitat_striped.tif')
+    rio_copy(habitat_shift_tif, striped_tif, driver='GTiff', tiled=False)
+    return striped_tif
+
+
+def test_zonal_stats_raster_label_striped(acs2016_gdf, habitat_shift_tif,
+                                          habitat_striped_tif):
+    with rasterio.open(habitat_striped_tif) as rast_ds:
+        block_rows, block_cols = rast_ds.block_shapes[0]
+        assert block_cols == rast_ds.width
+        # the strips are cut across their width
+        tile_rows, tile_cols = _tile_shape(rast_ds, 1024)
+    assert tile_rows % block_rows == 0 and tile_cols == 1024
+    stats = ['count', 'mean', 'max']
+    expected = zonal_stats_raster(acs2016_gdf.copy(), habitat_shift_tif,
+                                  stats=stats, nodata=255, engine='label')
+    zonal_result = zonal_stats_raster(acs2016_gdf.copy(), habitat_striped_tif,
+                                      stats=stats, nodata=255, engine='label')
+    for stat in stats:
+        column = f'zonal_{stat}'
+        assert zonal_result[column].values == pytest.approx(
+            expected[column].values, nan_ok=True
+        )
+
+
+def test_zonal_stats_raster_label_diff_proj(acs2016_gdf,
+                                            habitat_fl_stateplane_tif):
+    zonal_result = zonal_stats_raster(acs2016_gdf, habitat_fl_stateplane_tif,
+                                      engine='label')
+    assert zonal_result['zonal_count'][0] == 1302
+    assert zonal_result['zonal_max'][0] == 42
+    # the engines warp the raster with the exact and the approximate
+    # transformer, which resample a few cells differently
+    stats = ['count', 'mean', 'min', 'max']
+    expected = zonal_stats_raster(acs2016_gdf.copy(),
+                                  habitat_fl_stateplane_tif, stats=stats)
+    zonal_result = zonal_stats_raster(acs2016_gdf.copy(),
+                                      habitat_fl_stateplane_tif, stats=stats,
+                                      engine='label')
+    for stat in ['count', 'min', 'max']:
+        column = f'zonal_{stat}'
+        assert zonal_result[column].values == pytest.approx(
+            expected[column].astype(float).values, nan_ok=True
+        )
+    mean_diff = (zonal_result['zonal_mean'] - expected['zonal_mean']).abs()
+    assert (mean_diff / expected['zonal_mean']).max() < 0.05
+    assert mean_diff.mean() < 0.05
+
+
+def test_zonal_stats_raster_multi(acs2016_gdf, habitat_shift_tif,
+                                  habitat_fl_stateplane_tif):
+    rasters = [habitat_shift_tif, (habitat_fl_stateplane_tif, 1)]
+    zonal_result = zonal_stats_raster(acs2016_gdf, rasters, stats='count',
+                                      stats_prefix=['shift', 'stateplane'],
+                                      engine='label')
+    assert list(zonal_result.columns[-2:]) == ['shift_count',
+                                               'stateplane_count']
+    assert zonal_result['shift_count'][0] == 1303
+    assert zonal_result['stateplane_count'][0] == 1302
+
+
+def test_zonal_stats_raster_reproject_zones(acs2016_gdf,
+                                            habitat_fl_stateplane_tif):
+    zonal_result = zonal_stats_raster(acs2016_gdf.copy(),
+                                      habitat_fl_stateplane_tif,
+                                      stats='count', reproject='zones')
+    label_result = zonal_stats_raster(acs2016_gdf, habitat_fl_stateplane_tif,
+                                      stats='count', reproject='zones',
+                                      engine='label')
+    assert zonal_result['zonal_count'][0] == 1305
+    assert (zonal_result['zonal_count'] == label_result['zonal_count']).all()
+    # the zones keep their CRS in the output
+    assert zonal_result.crs == acs2016_gdf.crs
+
+
+def test_zonal_stats_raster_warp_cache(acs2016_gdf, habitat_fl_stateplane_tif,
+                                       tmp_path):
+    # invalid arguments raise before the raster is warped into the cache
+    for kwargs in ({'engine': 'lable'}, {'coverage': 'fraction'},
+                   {'engine': 'label', 'stats': 'majority'}):
+        with pytest.raises(ValueError):
+            zonal_stats_raster(acs2016_gdf.copy(), habitat_fl_stateplane_tif,
+                               warp_cache=str(tmp_path), **kwargs)
+    assert not list(tmp_path.iterdir())
+    expected = zonal_stats_raster(acs2016_gdf.copy(),
+                                  habitat_fl_stateplane_tif)
+    for _ in range(2):
+        zonal_result = zonal_stats_raster(acs2016_gdf.copy(),
+                                          habitat_fl_stateplane_tif,
+                                          warp_cache=str(tmp_path))
+        assert zonal_result['zonal_mean'].equals(expected['zonal_mean'])
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_zonal_stats_raster_label_cache(acs2016_gdf, habitat_shift_tif,
+                                        tmp_path):
+    stats = ['count', 'mean', 'std', 'median']
+    expected = zonal_stats_raster(acs2016_gdf.copy(), habitat_shift_tif,
+                                  stats=stats, nodata=255, engine='label')
+    # the first call saves the labels, the others memory-map them
+    for n_jobs in (1, 1, 2):
+        zonal_result = zonal_stats_raster(acs2016_gdf.copy(),
+                                          habitat_shift_tif, stats=stats,
+                                          nodata=255, engine='label',
+                                          n_jobs=n_jobs,
+                                          label_cache=str(tmp_path))
+        for stat in stats:
+            column = f'zonal_{stat}'
+            assert zonal_result[column].values == pytest.approx(
+                expected[column].values, nan_ok=True
+            )
+    assert len(list(tmp_path.iterdir())) == 1
+    with pytest.raises(ValueError):
+        zonal_stats_raster(acs2016_gdf, habitat_shift_tif,
+                           label_cache=str(tmp_path))
+
+
+def test_zonal_stats_raster_percentile(acs2016_gdf, habitat_shift_tif):
+    stats = ['median', 'percentile_10', 'percentile_75.5']
+    expected = zonal_stats_raster(acs2016_gdf.copy(), habitat_shift_tif,
+                                  stats=stats, nodata=255)
+    zonal_result = zonal_stats_raster(acs2016_gdf, habitat_shift_tif,
+                                      stats=stats, nodata=255, engine='label')
+    # the histograms of integer rasters are exact
+    for stat in stats:
+        column = f'zonal_{stat}'
+        assert zonal_result[column].values == pytest.approx(
+            expected[column].astype(float).values, nan_ok=True
+        )
+
+
+def test_quantile_sketch():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(size=10000)
+    labels = rng.integers(0, 3, size=10000)
+    sketch = _QuantileSketch(4, relative_accuracy=0.01)
+    # histograms of parts of the values merge into those of all values
+    for part in np.array_split(np.arange(10000), 4):
+        part_sketch = _QuantileSketch(4, relative_accuracy=0.01)
+        part_sketch.update(labels[part], values[part])
+        sketch.merge(part_sketch)
+    median = sketch.quantile(50)
+    for zone in range(3):
+        expected = np.median(values[labels == zone])
+        assert median[zone] == pytest.approx(expected, rel=0.01)
+    assert np.isnan(median[3])
+
+
+def test_class_accumulator():
+    labels = np.array([0, 0, 2, 2, 2])
+    # a wide range of values is sorted instead of looked up
+    for values in (np.array([5, 9, 5, 5, 255]),
+                   np.array([5, 10 ** 6, 5, 5, 255])):
+        accumulator = _ClassAccumulator(3)
+        accumulator.update(labels, values, values != 255)
+        part = _ClassAccumulator(2)
+        part.update(np.array([1]), np.array([7]), np.array([True]))
+        accumulator.merge(part, np.array([0, 2]))
+        assert list(accumulator.classes) == [5, 7, values[1]]
+        assert accumulator.counts.tolist() == [[1, 0, 1], [0, 0, 0],
+                                               [2, 1, 0]]
+
+
+def test_zonal_stats_raster_n_jobs(acs2016_gdf, habitat_shift_tif):
+    stats = ['count', 'mean', 'std', 'min', 'max', 'median']
+    expected = zonal_stats_raster(acs2016_gdf.copy(), habitat_shift_tif,
+                                  stats=stats, nodata=255, engine='label')
+    zonal_result = zonal_stats_raster(acs2016_gdf, habitat_shift_tif,
+                                      stats=stats, nodata=255, engine='label',
+                                      n_jobs=2)
+    for stat in stats:
+        column = f'zonal_{stat}'
+        assert zonal_result[column].values == pytest.approx(
+            expected[column].values, nan_ok=True
+        )
+
+
+def test_zonal_stats_raster_fraction(acs2016_gdf, habitat_shift_tif):
+    zonal_result = zonal_stats_raster(acs2016_gdf, habitat_shift_tif,
+                                      stats=['count', 'mean'], nodata=255,
+                                      engine='label', coverage='fraction')
+    # the raster covers the first zone, its cell fractions add up to its area
+    assert zonal_result['zonal_count'][0] == pytest.approx(
+        acs2016_gdf.area[0] / 900, rel=0.001
+    )
+    assert round(zonal_result['zonal_mean'][0], 4) == 14.4832
+    with pytest.raises(ValueError):
+        zonal_stats_raster(acs2016_gdf, habitat_shift_tif, stats='median',
+                           engine='label', coverage='fraction')
+    with pytest.raises(ValueError):
+        zonal_stats_raster(acs2016_gdf, habitat_shift_tif,
+                           coverage='fraction')
+
+
+def test_zonal_stats_raster_fraction_striped(acs2016_gdf, habitat_shift_tif,
+                                             habitat_striped_tif):
+    with rasterio.open(habitat_striped_tif) as rast_ds:
+        # the tiles of the supersampled labels are bounded on both sides
+        assert _tile_shape(rast_ds, 2048 // 8)[1] == 256
+    expected = zonal_stats_raster(acs2016_gdf.copy(), habitat_shift_tif,
+                                  stats=['count', 'mean'], nodata=255,
+                                  engine='label', coverage='fraction')
+    zonal_result = zonal_stats_raster(acs2016_gdf.copy(), habitat_striped_tif,
+                                      stats=['count', 'mean'], nodata=255,
+                                      engine='label', coverage='fraction')
+    for column in ['zonal_count', 'zonal_mean']:
+        assert zonal_result[column].values == pytest.approx(
+            expected[column].values, nan_ok=True
+        )
+
+
+def test_tabulate(acs2016_gdf, habitat_shift_tif):
+    area_df = tabulate(acs2016_gdf, habitat_shift_tif, nodata=255)
+    assert area_df.shape == (155, 26)
+    assert round(area_df.loc[0, 7]) == 103500
+    # cell centers are in one zone only, the classes add up to the zone area
+    assert area_df.loc[0].sum() == pytest.approx(acs2016_gdf.area[0],
+                                                 rel=0.01)
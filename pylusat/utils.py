@@ -1,11 +1,15 @@
+import warnings
 from rasterio import features
+from rasterio.io import MemoryFile
 from affine import Affine
 import numpy as np
+import scipy
 from geopandas import GeoDataFrame
 from pandas import DataFrame
 
 
-def rasterize_geometry(gdf, cellsize, value_clm=None, value_fill=0):
+def rasterize_geometry(gdf, cellsize, value_clm=None, value_fill=0,
+                       extent=None, merge_alg="replace"):
     """
     Transform vector data into a 2-d array. If any (or a part of) geometry
     presents at a given cell, the cell will be assigned to a value of 1,
@@ -22,6 +26,12 @@ def rasterize_geometry(gdf, cellsize, value_clm=None, value_fill=0):
         output array.
     value_fill : int, optional
         Fill value for all areas not covered by the input geometries.
+    extent : tuple, optional
+        ``(min_x, min_y, max_x, max_y)`` of the output array. Defaults to the
+        total bounds of the input GeoDataFrame.
+    merge_alg : {"replace", "add"}, optional
+        Whether a cell covered by several geometries takes the value of the
+        last one, or the sum of their values.
     
     Returns
     -------
@@ -37,24 +47,56 @@ def rasterize_geometry(gdf, cellsize, value_clm=None, value_fill=0):
     nodata : int or float
         The no data value used during the rasterization.
     """
-    extent = gdf.total_bounds
+    extent = gdf.total_bounds if extent is None else extent
     output_shape = (int(round((extent[3] - extent[1]) / cellsize)),
                     int(round((extent[2] - extent[0]) / cellsize)))
     trans = Affine(cellsize, 0, extent[0], 0, -cellsize, extent[3])
+    merge_alg = features.MergeAlg[merge_alg]
     if value_clm is None:
         arr = features.rasterize(gdf[gdf.geometry.name],
                                  out_shape=output_shape,
                                  fill=value_fill,
-                                 transform=trans)
+                                 transform=trans,
+                                 merge_alg=merge_alg)
     else:
         arr = features.rasterize(
             tuple(zip(gdf[gdf.geometry.name], gdf[value_clm])),
-            out_shape=output_shape, fill=value_fill, transform=trans
+            out_shape=output_shape, fill=value_fill, transform=trans,
+            merge_alg=merge_alg
         )
     nodata = value_fill
     return arr, trans, extent, nodata
 
 
+def write_raster(arr, transform, crs, nodata=None):
+    """
+    Write a 2D array into an in-memory GeoTIFF.
+
+    Parameters
+    ----------
+    arr : numpy.ndarray
+        The 2D array to write as the first band.
+    transform : Affine
+        The affine transformation of the array.
+    crs : str or rasterio.crs.CRS or pyproj.CRS
+        Coordinate reference system of the output raster.
+    nodata : int or float, optional
+        Value for no data cells.
+
+    Returns
+    -------
+    rasterio.io.DatasetReader
+        The raster dataset opened from a rasterio ``MemoryFile``.
+    """
+    with MemoryFile() as memfile:
+        rst = memfile.open(driver='GTiff', count=1, dtype=arr.dtype,
+                           crs=crs, width=arr.shape[1], height=arr.shape[0],
+                           transform=transform, nodata=nodata)
+        rst.write(arr, indexes=1)
+        rst.close()
+        return memfile.open(driver="GTiff")
+
+
 def cntrd_array(gdf):
     """
     Get the coordinates of the centroids in a 2D array.
@@ -77,6 +119,162 @@ def cntrd_array(gdf):
         raise TypeError("The input data must be a GeoDataFrame.")
 
 
+def segment_array(gdf):
+    """
+    Get the segments of the line geometries in a 2D array.
+
+    Parameters
+    ----------
+    gdf : geopandas.GeoDataFrame
+        Input GeoDataFrame whose geometry is of line.
+
+    Returns
+    -------
+    segments : numpy.ndarray
+        An n by 4 2D array where each row contains the coordinates
+        (x0, y0, x1, y1) of the two ends of a line segment.
+    positions : numpy.ndarray
+        The (integer) position in the input GeoDataFrame of the geometry to
+        which each segment belongs.
+    """
+    if not isinstance(gdf, GeoDataFrame):
+        raise TypeError("The input data must be a GeoDataFrame.")
+    segments, positions = [], []
+    for pos, geom in enumerate(gdf.geometry):
+        if geom is None or geom.is_empty:
+            continue
+        for part in getattr(geom, "geoms", [geom]):
+            coords = np.asarray(part.coords)[:, :2]
+            if len(coords) < 2:
+                continue
+            segments.append(np.hstack((coords[:-1], coords[1:])))
+            positions.append(np.full(len(coords) - 1, pos))
+    if not segments:
+        return np.empty((0, 4)), np.empty(0, dtype=int)
+    return np.vstack(segments), np.concatenate(positions)
+
+
+# mean radius of the earth (IUGG), in meters
+EARTH_RADIUS = 6371008.8
+
+
+def sphere_array(gdf):
+    """
+    Get the centroids of a GeoDataFrame in geographic coordinates as 3D
+    coordinates on the unit sphere.
+
+    Parameters
+    ----------
+    gdf : geopandas.GeoDataFrame
+        Input GeoDataFrame in a geographic (longitude, latitude) CRS.
+
+    Returns
+    -------
+    output : numpy.ndarray
+        An n by 3 2D array where each row contains the (x, y, z) coordinates
+        of the centroids on the unit sphere. The euclidean (chord) distance
+        between two rows converts to the great circle distance by
+        ``chord_to_arc``.
+    """
+    with warnings.catch_warnings():
+        # centroids of geometries in a geographic CRS
+        warnings.filterwarnings("ignore", category=UserWarning)
+        lon, lat = np.radians(cntrd_array(gdf)).T
+    return np.column_stack((np.cos(lat) * np.cos(lon),
+                            np.cos(lat) * np.sin(lon),
+                            np.sin(lat)))
+
+
+def chord_to_arc(chord):
+    """Convert chord lengths on the unit sphere to great circle distances
+    in meters."""
+    return 2 * EARTH_RADIUS * np.arcsin(np.minimum(chord / 2, 1))
+
+
+def arc_to_chord(arc):
+    """Convert great circle distances in meters to chord lengths on the unit
+    sphere."""
+    return 2 * np.sin(np.minimum(arc / EARTH_RADIUS, np.pi) / 2)
+
+
+def iter_chunks(n, chunk_size=None):
+    """
+    Split n rows into consecutive chunks.
+
+    Parameters
+    ----------
+    n : int
+        Total number of rows.
+    chunk_size : int, optional
+        Maximum number of rows in each chunk. If None, a single chunk
+        containing all rows is returned.
+
+    Returns
+    -------
+    generator of tuple
+        ``(start, stop)`` positions of each chunk.
+    """
+    if chunk_size is None or chunk_size >= n:
+        chunk_size = max(n, 1)
+    elif chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer.")
+    return ((start, min(start + chunk_size, n))
+            for start in range(0, n, chunk_size))
+
+
+def workers_kwarg(workers):
+    """
+    The keyword argument setting the number of workers of ``cKDTree``
+    queries, which is `workers` since scipy 1.6 and `n_jobs` before.
+
+    Parameters
+    ----------
+    workers : int
+        Number of workers, -1 uses all CPUs.
+
+    Returns
+    -------
+    dict
+        ``{"workers": workers}``, or ``{"n_jobs": workers}`` on scipy < 1.6.
+    """
+    version = tuple(int(v) for v in scipy.__version__.split(".")[:2])
+    return {"workers" if version >= (1, 6) else "n_jobs": workers}
+
+
+def split_segments(segments, max_length):
+    """
+    Split line segments longer than a maximum length into equal pieces.
+
+    Parameters
+    ----------
+    segments : numpy.ndarray
+        An n by 4 2D array of segments, see ``segment_array``.
+    max_length : float
+        The maximum length of the output segments.
+
+    Returns
+    -------
+    segments : numpy.ndarray
+        An m by 4 2D array of segments.
+    source : numpy.ndarray
+        The row in the input array from which each output segment comes.
+    """
+    lengths = np.hypot(segments[:, 2] - segments[:, 0],
+                       segments[:, 3] - segments[:, 1])
+    n_pieces = np.maximum(np.ceil(lengths / max_length), 1).astype(int)
+    source = np.repeat(np.arange(len(segments)), n_pieces)
+    if len(source) == len(segments):
+        return segments, source
+    # order of each piece within the segment it comes from
+    piece = np.arange(len(source)) - np.repeat(np.cumsum(n_pieces) - n_pieces,
+                                               n_pieces)
+    start = segments[source, :2]
+    delta = segments[source, 2:] - start
+    t0 = (piece / n_pieces[source])[:, None]
+    t1 = ((piece + 1) / n_pieces[source])[:, None]
+    return np.hstack((start + t0 * delta, start + t1 * delta)), source
+
+
 def inv_affine(gdf, cellsize, max_y, min_x):
     """
     Convert (x, y) coordinates of the centroids of a GeoDataFrame to
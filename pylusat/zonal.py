@@ -1,8 +1,16 @@
+import hashlib
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from rasterstats import zonal_stats
+import numpy as np
 import pandas as pd
 from affine import Affine
 from geopandas import GeoDataFrame
-from pylusat.base import GeoDataFrameManager
+from rasterio import features
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
+from pylusat.base import GeoDataFrameManager, UnitHandler
 from pylusat.base import RasterManager
 
 
@@ -11,22 +19,832 @@ def _to_affine(cellsize, max_y, min_x):
     return Affine(cellsize, 0, min_x, 0, -cellsize, max_y)
 
 
+# the subcells per side of a cell, whose centers give the coverage fraction
+_SUPERSAMPLE = 8
+
+LABEL_STATS = ('count', 'sum', 'mean', 'min', 'max', 'std', 'range',
+               'nodata')
+
+
+def _is_percentile(stat):
+    """Whether stat is 'median' or 'percentile_<q>' with q in [0, 100]."""
+    if stat == 'median':
+        return True
+    if not stat.startswith('percentile_'):
+        return False
+    try:
+        return 0 <= float(stat[11:]) <= 100
+    except ValueError:
+        return False
+
+
+class _QuantileSketch:
+    """
+    Mergeable per-zone histograms of raster values, from which quantiles are
+    read without keeping the values.
+
+    With exact=True, each (integer) value has its own bucket and quantiles
+    are exact. Otherwise values go into logarithmic buckets (as in DDSketch)
+    and each quantile is within relative_accuracy of the exact one. The
+    counts are kept as sparse (zone, bucket) pairs, so the memory is bounded
+    by the number of distinct buckets in each zone, not the number of cells.
+    """
+
+    # the bucket exponents are clipped to [-_MAX_INDEX, _MAX_INDEX], so
+    # that the bucket keys fit into 32 bits
+    _MAX_INDEX = 2 ** 29
+
+    def __init__(self, n_zones, exact=False, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1.")
+        self.n_zones = n_zones
+        self.exact = exact
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        # sorted (zone << 32 | bucket key) codes and their counts
+        self.codes = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._n_pending = 0
+
+    def _bucket_keys(self, values):
+        if self.exact:
+            return values.astype(np.int64) + 2 ** 31
+        max_index = self._MAX_INDEX
+        with np.errstate(divide='ignore'):
+            index = np.ceil(np.log(np.abs(values)) / np.log(self.gamma))
+        index = np.clip(index, -max_index, max_index).astype(np.int64)
+        # ordered keys: negative values, zero, positive values
+        return np.where(values > 0, 3 * max_index + 2 + index,
+                        np.where(values < 0, max_index - index,
+                                 2 * max_index + 1))
+
+    def _bucket_values(self, keys):
+        if self.exact:
+            return (keys - 2 ** 31).astype(float)
+        max_index = self._MAX_INDEX
+        positive = keys > 2 * max_index + 1
+        index = np.where(positive, keys - 3 * max_index - 2,
+                         max_index - keys)
+        # the value of a bucket within the relative accuracy of its bounds
+        values = 2 * self.gamma ** index.astype(float) / (self.gamma + 1)
+        return np.where(positive, values,
+                        np.where(keys < 2 * max_index + 1, -values, 0.))
+
+    def update(self, labels, values):
+        """Add values in the zones of labels (zone positions)."""
+        codes = (labels.astype(np.int64) << 32) | self._bucket_keys(values)
+        codes, counts = np.unique(codes, return_counts=True)
+        self._add(codes, counts)
+
+    def merge(self, other, positions=None):
+        """Merge the histograms of other, of the same zones, or of the zones
+        at positions in self if given."""
+        codes, counts = other._compact()
+        if positions is not None and not isinstance(positions, slice):
+            codes = (positions[codes >> 32].astype(np.int64) << 32) \
+                | (codes & 0xFFFFFFFF)
+        self._add(codes, counts)
+        return self
+
+    def _add(self, codes, counts):
+        self._pending.append((codes, counts))
+        self._n_pending += len(codes)
+        # amortized compaction, the pending pairs never outgrow the sketch
+        if self._n_pending > max(len(self.codes), 2 ** 16):
+            self._compact()
+
+    def _compact(self):
+        if self._pending:
+            codes = np.concatenate([self.codes] +
+                                   [c for c, _ in self._pending])
+            counts = np.concatenate([self.counts] +
+                                    [n for _, n in self._pending])
+            self.codes, inverse = np.unique(codes, return_inverse=True)
+            self.counts = np.bincount(inverse, weights=counts) \
+                .astype(np.int64)
+            self._pending = []
+            self._n_pending = 0
+        return self.codes, self.counts
+
+    def histogram(self):
+        """(zone positions, bucket values, counts) of the non-empty buckets,
+        sorted by zone and value."""
+        codes, counts = self._compact()
+        return codes >> 32, self._bucket_values(codes & 0xFFFFFFFF), counts
+
+    def quantile(self, q):
+        """The q-th percentile of each zone, interpolated between the
+        closest ranks as ``np.percentile``. NaN for empty zones."""
+        codes, counts = self._compact()
+        zones = codes >> 32
+        bucket_values = self._bucket_values(codes & 0xFFFFFFFF)
+        cum_counts = np.cumsum(counts)
+        zone_count = np.bincount(zones, weights=counts,
+                                 minlength=self.n_zones).astype(np.int64)
+        zone_start = np.cumsum(zone_count) - zone_count
+        hit = zone_count > 0
+        rank = (zone_count[hit] - 1) * q / 100
+        low, high = np.floor(rank), np.ceil(rank)
+        # the bucket that holds the cell of each rank
+        low_value = bucket_values[np.searchsorted(
+            cum_counts, zone_start[hit] + low, side='right')]
+        high_value = bucket_values[np.searchsorted(
+            cum_counts, zone_start[hit] + high, side='right')]
+        output_arr = np.full(self.n_zones, np.nan)
+        output_arr[hit] = low_value + (high_value - low_value) * (rank - low)
+        return output_arr
+
+
+class _ZonalAccumulator:
+    """
+    Per-zone statistics of raster values that can be updated cell by cell
+    and merged with the statistics of other cells of the same zones.
+
+    The variance is tracked as the sum of squared deviations (M2), merged
+    with the pairwise formula of Chan et al., which does not lose precision
+    as a difference of large sums of squares would. If weighted, each cell
+    is weighted (e.g., by the fraction of it covered by the zone), and
+    count and nodata are sums of weights.
+    """
+
+    def __init__(self, n_zones, sketch=None, weighted=False):
+        self.sketch = sketch
+        count_dtype = float if weighted else np.int64
+        self.count = np.zeros(n_zones, dtype=count_dtype)
+        self.nodata = np.zeros(n_zones, dtype=count_dtype)
+        self.sum = np.zeros(n_zones)
+        self.m2 = np.zeros(n_zones)
+        self.min = np.full(n_zones, np.inf)
+        self.max = np.full(n_zones, -np.inf)
+
+    def __len__(self):
+        return len(self.count)
+
+    def update(self, labels, values, valid, weights=None):
+        """Add cells of values in the zones of labels (zone positions), only
+        the valid cells are summarized, the others count as nodata."""
+        n_zones = len(self)
+        self.nodata += np.bincount(
+            labels[~valid], minlength=n_zones,
+            weights=None if weights is None else weights[~valid]
+        )
+        labels = labels[valid]
+        values = values[valid].astype(float)
+        weights = np.ones(len(values)) if weights is None else weights[valid]
+        count = np.bincount(labels, weights=weights, minlength=n_zones)
+        if self.count.dtype != float:
+            count = count.astype(np.int64)
+        total = np.bincount(labels, weights=values * weights,
+                            minlength=n_zones)
+        mean = np.divide(total, count, out=np.zeros(n_zones), where=count > 0)
+        m2 = np.bincount(labels,
+                         weights=weights * (values - mean[labels]) ** 2,
+                         minlength=n_zones)
+        self._merge_moments(count, total, m2)
+        np.minimum.at(self.min, labels, values)
+        np.maximum.at(self.max, labels, values)
+        if self.sketch is not None:
+            self.sketch.update(labels, values)
+
+    def merge(self, other, positions=None):
+        """Merge the statistics of other, accumulated on other cells of the
+        same zones, or of the zones at positions (unique positions in self)
+        if given."""
+        positions = slice(None) if positions is None else positions
+        self.nodata[positions] += other.nodata
+        self._merge_moments(other.count, other.sum, other.m2, positions)
+        self.min[positions] = np.minimum(self.min[positions], other.min)
+        self.max[positions] = np.maximum(self.max[positions], other.max)
+        if self.sketch is not None:
+            self.sketch.merge(other.sketch, positions)
+        return self
+
+    def _merge_moments(self, count, total, m2, positions=slice(None)):
+        self_count = self.count[positions]
+        self_sum = self.sum[positions]
+        merged = self_count + count
+        hit = (self_count > 0) & (count > 0)
+        delta = total[hit] / count[hit] - self_sum[hit] / self_count[hit]
+        m2 = m2.astype(float)
+        m2[hit] += delta ** 2 * self_count[hit] * count[hit] / merged[hit]
+        self.m2[positions] += m2
+        self.count[positions] = merged
+        self.sum[positions] += total
+
+    def to_frame(self, stats):
+        """A DataFrame of stats, one row per zone. Zones without any valid
+        cell get NaN for all stats but count and nodata."""
+        empty = self.count == 0
+        count = np.where(empty, 1, self.count)
+        columns = {
+            'count': lambda: self.count,
+            'nodata': lambda: self.nodata,
+            'sum': lambda: self.sum,
+            'mean': lambda: self.sum / count,
+            'min': lambda: self.min,
+            'max': lambda: self.max,
+            'std': lambda: np.sqrt(self.m2 / count),
+            'range': lambda: self.max - self.min,
+        }
+        for stat in stats:
+            if _is_percentile(stat):
+                q = 50 if stat == 'median' else float(stat[11:])
+                columns[stat] = lambda q=q: self.sketch.quantile(q)
+        output_df = pd.DataFrame({stat: columns[stat]() for stat in stats})
+        filled = [stat for stat in stats if stat not in ('count', 'nodata')]
+        output_df.loc[empty, filled] = np.nan
+        return output_df
+
+
+class _ClassAccumulator:
+    """
+    Mergeable per-zone counts of the cells of each class (integer value) of
+    a categorical raster, as a zone by class array.
+
+    The cells of a tile are counted with one ``np.bincount`` of their
+    combined (zone, class) codes, over the range of zones and the classes
+    of the tile, and the classes found so far are the sorted columns.
+    """
+
+    # the largest range of values indexed by a lookup table rather than
+    # sorted, e.g., any 16-bit raster
+    MAX_LOOKUP = 2 ** 16
+
+    def __init__(self, n_zones, weighted=False):
+        self.classes = np.empty(0, dtype=np.int64)
+        self.counts = np.zeros((n_zones, 0),
+                               dtype=float if weighted else np.int64)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _columns(self, classes):
+        """The columns of classes (sorted and unique), adding the new ones."""
+        if not np.isin(classes, self.classes, assume_unique=True).all():
+            merged = np.union1d(self.classes, classes)
+            counts = np.zeros((len(self), len(merged)), self.counts.dtype)
+            counts[:, np.searchsorted(merged, self.classes)] = self.counts
+            self.classes, self.counts = merged, counts
+        return np.searchsorted(self.classes, classes)
+
+    def update(self, labels, values, valid, weights=None):
+        """Add cells of values in the zones of labels (zone positions), only
+        the valid cells are counted."""
+        labels = labels[valid]
+        values = values[valid].astype(np.int64)
+        if not len(values):
+            return
+        weights = None if weights is None else weights[valid]
+        low = values.min()
+        span = values.max() - low + 1
+        if span <= self.MAX_LOOKUP:
+            present = np.bincount(values - low, minlength=span) > 0
+            classes = low + np.flatnonzero(present)
+            class_pos = (np.cumsum(present) - 1)[values - low]
+        else:
+            classes, class_pos = np.unique(values, return_inverse=True)
+        first = labels.min()
+        n_rows = labels.max() - first + 1
+        counts = np.bincount(
+            (labels - first) * len(classes) + class_pos, weights=weights,
+            minlength=n_rows * len(classes)
+        ).reshape(n_rows, len(classes))
+        # the columns first, as new classes replace self.counts
+        columns = self._columns(classes)
+        self.counts[np.ix_(np.arange(first, first + n_rows), columns)] += \
+            counts
+
+    def merge(self, other, positions=None):
+        """Add the counts of another _ClassAccumulator, of the same zones, or
+        of the zones at positions (unique positions in self) if given."""
+        positions = np.arange(len(self)) if positions is None else positions
+        columns = self._columns(other.classes)
+        self.counts[np.ix_(positions, columns)] += other.counts
+        return self
+
+
+def _zone_layers(zone_geoms, margin):
+    """
+    Assign each zone to a layer such that no two zones of a layer can share
+    a cell, by greedy coloring of the zones within margin of each other.
+    """
+    # the bounding boxes expanded by margin on each side
+    expanded = zone_geoms.envelope.buffer(margin, join_style=2)
+    sindex = zone_geoms.sindex
+    query_bulk = getattr(sindex, "query_bulk", sindex.query)
+    zone_pos, neighbor_pos = query_bulk(expanded.values,
+                                        predicate="intersects")
+    order = np.argsort(zone_pos, kind="stable")
+    neighbor_pos = neighbor_pos[order]
+    n_zones = len(zone_geoms)
+    indptr = np.searchsorted(zone_pos[order], np.arange(n_zones + 1))
+    layers = np.full(n_zones, -1)
+    for i in range(n_zones):
+        used = set(layers[neighbor_pos[indptr[i]:indptr[i + 1]]])
+        layer = 0
+        while layer in used:
+            layer += 1
+        layers[i] = layer
+    return layers
+
+
+def _zone_windows(bounds, transform, shape):
+    """
+    (row_start, row_stop, col_start, col_stop) of the cells each zone may
+    touch, from its bounds (padded by one cell), clipped to the raster shape.
+    """
+    cols = (bounds[:, [0, 2]] - transform.c) / transform.a
+    rows = (bounds[:, [3, 1]] - transform.f) / transform.e
+    windows = np.column_stack([
+        np.floor(rows.min(axis=1)) - 1, np.ceil(rows.max(axis=1)) + 1,
+        np.floor(cols.min(axis=1)) - 1, np.ceil(cols.max(axis=1)) + 1,
+    ])
+    windows[:, :2] = windows[:, :2].clip(0, shape[0])
+    windows[:, 2:] = windows[:, 2:].clip(0, shape[1])
+    return windows.astype(np.int64)
+
+
+def _tile_shape(rast_ds, min_size=1024):
+    """A whole number of internal blocks, at least min_size cells (or the
+    raster size) on each side. A side of a block larger than min_size, such
+    as the width of a strip, is cut to min_size cells, so a tile has fewer
+    than (2 * min_size) ** 2 cells whatever the layout of the raster."""
+    block_rows, block_cols = rast_ds.block_shapes[0]
+    return tuple(
+        min(-(-min_size // block) * block if block <= min_size else min_size,
+            size)
+        for block, size in ((block_rows, rast_ds.height),
+                            (block_cols, rast_ds.width))
+    )
+
+
+def _iter_tiles(windows, tile_shape):
+    """
+    Yield (window, zone positions) for each block-aligned tile that any zone
+    window overlaps. The window is the part of the tile covered by the zone
+    windows, so the cells no zone can touch are never read.
+    """
+    tile_rows, tile_cols = tile_shape
+    hit = (windows[:, 1] > windows[:, 0]) & (windows[:, 3] > windows[:, 2])
+    zone_pos = np.flatnonzero(hit)
+    windows = windows[hit]
+    # the range of tiles overlapped by each zone window
+    row_start, row_stop = windows[:, 0] // tile_rows, \
+        (windows[:, 1] - 1) // tile_rows + 1
+    col_start, col_stop = windows[:, 2] // tile_cols, \
+        (windows[:, 3] - 1) // tile_cols + 1
+    n_cols = col_stop - col_start
+    n_tiles = (row_stop - row_start) * n_cols
+    # one (zone, tile) pair for each tile of each zone
+    pair_zone = np.repeat(np.arange(len(windows)), n_tiles)
+    offset = np.arange(n_tiles.sum()) - np.repeat(np.cumsum(n_tiles) - n_tiles,
+                                                  n_tiles)
+    pair_row = row_start[pair_zone] + offset // n_cols[pair_zone]
+    pair_col = col_start[pair_zone] + offset % n_cols[pair_zone]
+    tile_id = pair_row * (col_stop.max(initial=0) + 1) + pair_col
+    order = np.argsort(tile_id, kind="stable")
+    tile_id, pair_zone = tile_id[order], pair_zone[order]
+    pair_row, pair_col = pair_row[order], pair_col[order]
+    starts = np.flatnonzero(np.r_[True, tile_id[1:] != tile_id[:-1]])
+    for start, stop in zip(starts, np.append(starts[1:], len(tile_id))):
+        zones = pair_zone[start:stop]
+        tile_row, tile_col = pair_row[start], pair_col[start]
+        row_off = max(windows[zones, 0].min(), tile_row * tile_rows)
+        row_end = min(windows[zones, 1].max(), (tile_row + 1) * tile_rows)
+        col_off = max(windows[zones, 2].min(), tile_col * tile_cols)
+        col_end = min(windows[zones, 3].max(), (tile_col + 1) * tile_cols)
+        yield (Window(col_off, row_off, col_end - col_off, row_end - row_off),
+               zone_pos[zones])
+
+
+def _tile_labels(zone_geoms, layers, zone_pos, shape, transform,
+                 all_touched=True, supersample=None):
+    """
+    List of (cell indices, zone positions, coverage fractions) of the cells
+    of a tile in the zones at zone_pos (positions in zone_geoms), one item
+    per layer.
+
+    The fractions are None, unless supersample is given, in which case each
+    cell is split into supersample x supersample subcells, and its fraction
+    is the share of the subcells whose centers are in the zone. Zones of a
+    layer never share a cell, so the subcells of a cell are in one zone.
+    """
+    tile_labels = []
+    for layer in np.unique(layers[zone_pos]):
+        layer_pos = zone_pos[layers[zone_pos] == layer]
+        shapes = zip(zone_geoms.values[layer_pos], layer_pos + 1)
+        # 0 is the background, zones are labeled by position + 1
+        if supersample is None:
+            labels = features.rasterize(
+                shapes, out_shape=shape, transform=transform, fill=0,
+                all_touched=all_touched, dtype="int32"
+            ).ravel()
+            fractions = None
+        else:
+            h, w = shape
+            subcells = features.rasterize(
+                shapes, out_shape=(h * supersample, w * supersample),
+                transform=transform * Affine.scale(1 / supersample),
+                fill=0, dtype="int32"
+            ).reshape(h, supersample, w * supersample)
+            # reduce the contiguous subcell rows first, then the columns
+            labels = subcells.max(axis=1).reshape(
+                h, w, supersample).max(axis=2).ravel()
+            fractions = (subcells != 0).sum(axis=1, dtype=np.uint16).reshape(
+                h, w, supersample).sum(axis=2).ravel() / supersample ** 2
+        cells = np.flatnonzero(labels)
+        tile_labels.append((cells, labels[cells] - 1,
+                            None if fractions is None else fractions[cells]))
+    return tile_labels
+
+
+def _valid_cells(values, nodata):
+    """Boolean mask of the cells of values that are neither nodata nor
+    NaN."""
+    valid = np.ones(len(values), dtype=bool) if nodata is None \
+        else values != nodata
+    if np.issubdtype(values.dtype, np.floating):
+        valid &= ~np.isnan(values)
+    return valid
+
+
+def _new_accumulators(rast_bands, n_zones, relative_accuracy=None,
+                      weighted=False, classes=False):
+    """An empty _ZonalAccumulator for each item of rast_bands, which keeps
+    histograms (of the given relative_accuracy) unless it is None, or only
+    a _ClassAccumulator if classes."""
+    if classes:
+        return [_ClassAccumulator(n_zones, weighted) for _ in rast_bands]
+    accumulators = []
+    for rast_manager, _ in rast_bands:
+        sketch = None
+        if relative_accuracy is not None:
+            # integer values are counted exactly
+            sketch = _QuantileSketch(
+                n_zones, exact=np.can_cast(rast_manager.dtype, np.int32),
+                relative_accuracy=relative_accuracy
+            )
+        accumulators.append(_ZonalAccumulator(n_zones, sketch, weighted))
+    return accumulators
+
+
+def _zone_tiles(zone_geoms, rast_ds, supersample=None):
+    """The layers of zone_geoms (see _zone_layers), and the tiles of (window,
+    zone positions) of the grid of rast_ds that the zones overlap."""
+    transform = rast_ds.transform
+    layers = _zone_layers(zone_geoms, max(abs(transform.a), abs(transform.e)))
+    windows = _zone_windows(zone_geoms.bounds.values, transform, rast_ds.shape)
+    windows[zone_geoms.is_empty.values] = 0
+    # supersampled tiles have fewer than 512 cells per side (see
+    # _tile_shape), so the subcell labels of a tile and layer are below
+    # 4096 x 4096 int32 (64 MB), even for strips
+    tiles = _iter_tiles(windows, _tile_shape(
+        rast_ds, 1024 if supersample is None else 2048 // supersample
+    ))
+    return layers, tiles
+
+
+def _label_tiles(zone_geoms, layers, tiles, rast_ds, all_touched=True,
+                 supersample=None):
+    """Yield (window, _tile_labels) for each tile of (window, zone
+    positions) of the grid of rast_ds."""
+    for window, zone_pos in tiles:
+        yield window, _tile_labels(zone_geoms, layers, zone_pos,
+                                   (window.height, window.width),
+                                   rast_ds.window_transform(window),
+                                   all_touched, supersample)
+
+
+def _label_cache_path(label_cache, zone_geoms, rast_ds, all_touched=True,
+                      supersample=None):
+    """The directory in label_cache of the tile labels of zone_geoms on the
+    grid of rast_ds, keyed by the fingerprint of the zones, the transform
+    and shape of the grid, all_touched and supersample."""
+    fingerprint = GeoDataFrameManager(
+        GeoDataFrame(geometry=zone_geoms)
+    ).fingerprint
+    key = "|".join([fingerprint, repr(tuple(rast_ds.transform)),
+                    repr(rast_ds.shape), repr(all_touched),
+                    repr(supersample)])
+    return os.path.join(label_cache,
+                        hashlib.sha1(key.encode()).hexdigest())
+
+
+def _save_tile_labels(cache_path, labeled_tiles):
+    """
+    Write labeled_tiles of (window, _tile_labels) to cache_path, as .npy
+    files of the tile windows, the (tile, end) of the cells of each item of
+    the tile labels, and the concatenated cells, zone positions and
+    fractions (if any).
+    """
+    windows, items, cells, zones, fractions = [], [], [], [], []
+    end = 0
+    for tile, (window, tile_labels) in enumerate(labeled_tiles):
+        windows.append((window.col_off, window.row_off,
+                        window.width, window.height))
+        for tile_cells, tile_zones, tile_fractions in tile_labels:
+            end += len(tile_cells)
+            items.append((tile, end))
+            cells.append(tile_cells.astype(np.int32))
+            zones.append(tile_zones.astype(np.int32))
+            if tile_fractions is not None:
+                # multiples of 1 / supersample ** 2, exact in float32
+                fractions.append(tile_fractions.astype(np.float32))
+    arrays = {
+        'windows': np.array(windows, dtype=np.int64).reshape(-1, 4),
+        'items': np.array(items, dtype=np.int64).reshape(-1, 2),
+        'cells': np.concatenate(cells or [np.empty(0, np.int32)]),
+        'zones': np.concatenate(zones or [np.empty(0, np.int32)]),
+    }
+    if fractions:
+        arrays['fractions'] = np.concatenate(fractions)
+    # write to a temporary directory first, so that a concurrent reader
+    # never loads a partial cache
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    os.makedirs(temp_path, exist_ok=True)
+    for name, arr in arrays.items():
+        np.save(os.path.join(temp_path, f"{name}.npy"), arr)
+    try:
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # written by a concurrent call in the meantime
+        shutil.rmtree(temp_path)
+
+
+def _load_tile_labels(cache_path, start=0, stop=None):
+    """Yield (window, _tile_labels) for the tiles from start to stop saved
+    in cache_path, whose arrays are memory-mapped rather than read."""
+    arrays = {name[:-4]: np.load(os.path.join(cache_path, name),
+                                 mmap_mode='r')
+              for name in os.listdir(cache_path)}
+    windows, items = arrays['windows'], arrays['items']
+    fractions = arrays.get('fractions')
+    ends = items[:, 1]
+    starts = np.r_[0, ends[:-1]]
+    # the first item of each tile
+    first = np.searchsorted(items[:, 0], np.arange(len(windows) + 1))
+    stop = len(windows) if stop is None else stop
+    for tile in range(start, stop):
+        tile_labels = [
+            (arrays['cells'][a:b], arrays['zones'][a:b],
+             None if fractions is None else fractions[a:b])
+            for a, b in zip(starts[first[tile]:first[tile + 1]],
+                            ends[first[tile]:first[tile + 1]])
+        ]
+        yield Window(*windows[tile]), tile_labels
+
+
+def _accumulate_tiles(labeled_tiles, rast_bands, n_zones,
+                      relative_accuracy=None, weighted=False, classes=False):
+    """The accumulated stats (or class counts) of each item of rast_bands in
+    n_zones zones, over labeled_tiles of (window, _tile_labels)."""
+    accumulators = _new_accumulators(rast_bands, n_zones, relative_accuracy,
+                                     weighted, classes)
+    for window, tile_labels in labeled_tiles:
+        for (rast_manager, bidx), accumulator in zip(rast_bands,
+                                                     accumulators):
+            values = rast_manager.read_window(window, bidx).ravel()
+            valid = _valid_cells(values, rast_manager.nodata)
+            for cells, labels, fractions in tile_labels:
+                accumulator.update(labels, values[cells], valid[cells],
+                                   fractions)
+    return accumulators
+
+
+def _raster_spec(rast_manager):
+    """A picklable (path, nodata, WarpedVRT options) from which a worker
+    process reopens the dataset of rast_manager."""
+    rast_ds = rast_manager.rast_ds
+    if isinstance(rast_ds, WarpedVRT):
+        return (rast_ds.src_dataset.name, rast_manager.rast_nodata,
+                {'crs': rast_ds.crs, 'tolerance': rast_ds.tolerance,
+                 'resampling': rast_ds.resampling})
+    return rast_ds.name, rast_manager.rast_nodata, None
+
+
+def _open_raster_spec(rast_spec):
+    rast_path, nodata, vrt_options = rast_spec
+    if vrt_options is None:
+        return RasterManager.from_path(rast_path, nodata)
+    return RasterManager(
+        RasterManager.from_path(rast_path).reproject_vrt(**vrt_options),
+        nodata
+    )
+
+
+def _accumulate_tiles_job(zone_pos, zone_geoms, layers, tiles, rast_specs,
+                          all_touched=True, relative_accuracy=None,
+                          supersample=None, classes=False):
+    """_accumulate_tiles in a worker process, for the zones at zone_pos
+    (sorted), whose geometries and layers are given in that order."""
+    rast_bands = [(_open_raster_spec(spec), bidx) for spec, bidx in rast_specs]
+    tiles = [(window, np.searchsorted(zone_pos, pos)) for window, pos in tiles]
+    labeled_tiles = _label_tiles(zone_geoms, layers, tiles,
+                                 rast_bands[0][0].rast_ds, all_touched,
+                                 supersample)
+    return _accumulate_tiles(labeled_tiles, rast_bands, len(zone_geoms),
+                             relative_accuracy, supersample is not None,
+                             classes)
+
+
+def _accumulate_cached_job(cache_path, start, stop, rast_specs, n_zones,
+                           relative_accuracy=None, weighted=False,
+                           classes=False):
+    """_accumulate_tiles in a worker process, for the tiles from start to
+    stop of the tile labels saved in cache_path."""
+    rast_bands = [(_open_raster_spec(spec), bidx) for spec, bidx in rast_specs]
+    return _accumulate_tiles(_load_tile_labels(cache_path, start, stop),
+                             rast_bands, n_zones, relative_accuracy, weighted,
+                             classes)
+
+
+def _label_accumulate(zone_geoms, rast_bands, all_touched=True,
+                      relative_accuracy=None, n_jobs=1, supersample=None,
+                      label_cache=None, classes=False):
+    """
+    The accumulated stats of rasters in each zone, from the zones burned
+    into integer label arrays (one per layer of zones that do not share
+    cells).
+
+    rast_bands is a list of (RasterManager, band index) on the same grid,
+    which share the label arrays. The rasters are read tile by tile, only
+    where the zones are, so the peak memory is bounded by one tile. With
+    n_jobs > 1, the tiles are split among worker processes, which reopen the
+    rasters and return the stats of their zones to be merged. With
+    supersample, the cells are weighted by the fraction covered by the zones
+    (see _tile_labels). With label_cache, the labels of the tiles are saved
+    in (or, once saved, memory-mapped from) a directory of label_cache
+    instead of being burned again (see _label_cache_path). Returns a
+    _ZonalAccumulator for each item of rast_bands, or a _ClassAccumulator
+    if classes.
+    """
+    rast_ds = rast_bands[0][0].rast_ds
+    zone_geoms = zone_geoms.reset_index(drop=True)
+    n_zones = len(zone_geoms)
+    weighted = supersample is not None
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    serial = n_jobs is None or n_jobs <= 1
+
+    if label_cache is None:
+        layers, tiles = _zone_tiles(zone_geoms, rast_ds, supersample)
+        if serial:
+            return _accumulate_tiles(
+                _label_tiles(zone_geoms, layers, tiles, rast_ds, all_touched,
+                             supersample),
+                rast_bands, n_zones, relative_accuracy, weighted, classes
+            )
+        tiles = list(tiles)
+        n_tiles = len(tiles)
+    else:
+        cache_path = _label_cache_path(label_cache, zone_geoms, rast_ds,
+                                       all_touched, supersample)
+        if not os.path.isdir(cache_path):
+            os.makedirs(label_cache, exist_ok=True)
+            layers, tiles = _zone_tiles(zone_geoms, rast_ds, supersample)
+            _save_tile_labels(cache_path, _label_tiles(
+                zone_geoms, layers, tiles, rast_ds, all_touched, supersample
+            ))
+        if serial:
+            return _accumulate_tiles(_load_tile_labels(cache_path),
+                                     rast_bands, n_zones, relative_accuracy,
+                                     weighted, classes)
+        n_tiles = len(np.load(os.path.join(cache_path, 'windows.npy'),
+                              mmap_mode='r'))
+
+    rast_specs = [(_raster_spec(rast_manager), bidx)
+                  for rast_manager, bidx in rast_bands]
+    accumulators = _new_accumulators(rast_bands, n_zones, relative_accuracy,
+                                     weighted, classes)
+    # a few runs of adjacent tiles per worker, to balance the load
+    jobs = np.array_split(np.arange(n_tiles), max(min(n_tiles, n_jobs * 4),
+                                                  1))
+    with ProcessPoolExecutor(n_jobs) as executor:
+        futures = []
+        for job in jobs:
+            if not len(job):
+                continue
+            if label_cache is not None:
+                # the workers memory-map the labels of their tiles
+                futures.append((None, executor.submit(
+                    _accumulate_cached_job, cache_path, job[0], job[-1] + 1,
+                    rast_specs, n_zones, relative_accuracy, weighted, classes
+                )))
+                continue
+            job_tiles = [tiles[i] for i in job]
+            zone_pos = np.unique(np.concatenate(
+                [pos for _, pos in job_tiles]
+            ))
+            futures.append((zone_pos, executor.submit(
+                _accumulate_tiles_job, zone_pos,
+                zone_geoms.iloc[zone_pos].reset_index(drop=True),
+                layers[zone_pos], job_tiles, rast_specs, all_touched,
+                relative_accuracy, supersample, classes
+            )))
+        # merged in the order of the tiles, the output does not depend on
+        # the scheduling of the workers
+        for zone_pos, future in futures:
+            for accumulator, job_accumulator in zip(accumulators,
+                                                    future.result()):
+                accumulator.merge(job_accumulator, zone_pos)
+    return accumulators
+
+
+def _validate_label_stats(stats, supersample=None):
+    """Raise a ValueError if the "label" engine does not support stats."""
+    invalid_stats = {stat for stat in stats if not _is_percentile(stat)} \
+        - set(LABEL_STATS)
+    if invalid_stats:
+        raise ValueError(f'engine "label" does not support stats '
+                         f'{sorted(invalid_stats)}, valid stats are '
+                         f"{list(LABEL_STATS)}, 'median' and "
+                         f"'percentile_<q>'.")
+    if supersample is not None and any(_is_percentile(stat)
+                                       for stat in stats):
+        raise ValueError("'median' and 'percentile_<q>' are not supported "
+                         "with fractional coverage.")
+
+
+def _label_stats(zone_geoms, rast_bands, stats, all_touched=True,
+                 relative_accuracy=0.01, n_jobs=1, supersample=None,
+                 label_cache=None):
+    """The stats of _label_accumulate, as a DataFrame for each item of
+    rast_bands (see _validate_label_stats)."""
+    if not any(_is_percentile(stat) for stat in stats):
+        relative_accuracy = None
+    accumulators = _label_accumulate(zone_geoms, rast_bands, all_touched,
+                                     relative_accuracy, n_jobs, supersample,
+                                     label_cache)
+    return [accumulator.to_frame(stats) for accumulator in accumulators]
+
+
+def _open_rasters(zone_gdf, rasters, nodata=None, reproject='raster',
+                  warp_cache=None, vrt_options=None):
+    """
+    Open rasters (paths or (path, band index) tuples) as a list of
+    (RasterManager, band index, CRS key), and a dict of the zone geometries
+    in the CRS of each key.
+
+    Rasters in another CRS than zone_gdf are warped with vrt_options, or, if
+    reproject is "zones", the zones are reprojected to their CRS.
+    """
+    if reproject not in ('raster', 'zones'):
+        raise ValueError('reproject must be either "raster" or "zones".')
+    gdf_crs = zone_gdf.crs
+    rast_bands = []
+    # the zone geometries in the CRS of each raster
+    zone_geoms = {}
+    for item in rasters:
+        rast_path, bidx = item if isinstance(item, tuple) else (item, 1)
+        rast_manager = RasterManager.from_path(rast_path, nodata)
+        rast_crs = rast_manager.get_rio_crs()
+
+        if gdf_crs.to_epsg() == rast_crs.to_epsg():
+            geom_crs = gdf_crs.to_epsg()
+            zone_geoms.setdefault(geom_crs, zone_gdf.geometry)
+        elif reproject == 'zones':
+            geom_crs = rast_crs.to_string()
+            if geom_crs not in zone_geoms:
+                zone_geoms[geom_crs] = zone_gdf.geometry.to_crs(rast_crs)
+        else:
+            geom_crs = gdf_crs.to_epsg()
+            zone_geoms.setdefault(geom_crs, zone_gdf.geometry)
+            vrt_options = vrt_options or {}
+            if warp_cache is None:
+                projected_rast = rast_manager.reproject_vrt(
+                    crs=f"EPSG:{gdf_crs.to_epsg()}", **vrt_options
+                )
+            else:
+                projected_rast = rast_manager.reproject_cached(
+                    f"EPSG:{gdf_crs.to_epsg()}", warp_cache, **vrt_options
+                )
+            rast_manager = RasterManager(projected_rast)
+        rast_bands.append((rast_manager, bidx, geom_crs))
+    return rast_bands, zone_geoms
+
+
 def zonal_stats_raster(zone_gdf, raster, stats=None,
-                       stats_prefix='zonal', nodata=None):
+                       stats_prefix='zonal', nodata=None,
+                       engine='rasterstats', reproject='raster',
+                       warp_cache=None, relative_accuracy=0.01, n_jobs=1,
+                       coverage='binary', label_cache=None):
     """
     Calculate specified stats for each geometry in the zone GeoDataFrame.
 
     If raster and zone GeoDataFrame were in different spatial reference
     systems, the raster will be warped (reprojected) to match the spatial
-    reference of the zone GeoDataFrame.
+    reference of the zone GeoDataFrame, unless `reproject` is "zones".
 
     Parameters
     ----------
     zone_gdf : geopandas.GeoDataFrame
         The zone GeoDataFrame whose geometry must be polygon.
-    raster : str
+    raster : str, tuple of (str, int), or list of them
         A path to a tif file or a connection string to a raster on PostgreSQL.
-        The raster dataset whose values are summarized.
+        The raster dataset whose values are summarized. A (path, band index)
+        tuple summarizes a band other than the first. A list summarizes all
+        the rasters (or bands) into one output. The zones are validated once,
+        and with the "label" engine, the rasters on the same grid are read
+        tile by tile with the same zone labels.
     stats : list of str, or space-delimited str, optional
         Which statistics to calculate for each zone.
         Defaults to rasterstats.utils.DEFAULT_STATS, i.e.,
@@ -34,12 +852,72 @@ def zonal_stats_raster(zone_gdf, raster, stats=None,
         Other valid stats are ['sum', 'std', 'median', 'majority', 'minority',
         'unique', 'range', 'nodata', 'nan'].
         See rasterstats for more details.
-    stats_prefix : str, default 'zonal'
+    stats_prefix : str or list of str, default 'zonal'
         The prefix used to name the output columns of the calculated stats.
         The output column name will be concatenated by a underscore.
-        e.g., 'zonal_mean'
+        e.g., 'zonal_mean'. If `raster` is a list, either one prefix per
+        raster, or a prefix to which the position of each raster is appended,
+        e.g., 'zonal_0_mean'.
     nodata : int or float
         Value for no data cells.
+    engine : {"rasterstats", "label"}, default "rasterstats"
+        "rasterstats" rasterizes and masks each zone separately with
+        ``rasterstats.zonal_stats``. "label" burns all zones at once into
+        integer label rasters aligned to the raster (overlapping or adjacent
+        zones that share a cell go into separate layers) and computes the
+        stats of all zones with grouped reductions such as ``np.bincount``.
+        It gives the same result for rasters in the CRS of the zones (see
+        below for warped rasters), with a runtime that barely grows with the
+        number of zones, but only supports the stats in `LABEL_STATS`:
+        'count', 'sum', 'mean', 'min', 'max', 'std', 'range' and 'nodata',
+        plus 'median' and 'percentile_<q>' (see `relative_accuracy`).
+        Cells outside the raster are not counted as 'nodata'. The raster is
+        read in block-aligned tiles of about 1024 x 1024 cells (strips are
+        cut across their width), only where the zones are, so the peak
+        memory is bounded by one tile rather than the whole band. A raster in
+        a different CRS is warped with GDAL's exact transformer, whose output
+        does not depend on the tiles read, while "rasterstats" warps it with
+        the faster approximate transformer (within 0.125 cells). The warped
+        cells, hence the stats, of the two engines may then differ slightly,
+        e.g., by a few percent of a zone mean; reproject the zones (see
+        `reproject`) for the same result.
+    reproject : {"raster", "zones"}, default "raster"
+        What to reproject when the raster and the zones are in different
+        CRSs. "raster" warps the raster to the CRS of the zones. "zones"
+        reprojects the (much smaller) zone geometries to the CRS of the raster
+        instead, which summarizes the original cells without any resampling.
+    warp_cache : str, optional
+        A directory in which warped rasters are stored as GeoTIFFs, keyed by
+        the path and modification time of the raster and the target CRS.
+        Later calls read the warped raster from the cache instead of warping
+        it again.
+    relative_accuracy : float, default 0.01
+        The relative error bound of 'median' and 'percentile_<q>' for the
+        "label" engine, which reads them from per-zone histograms built tile
+        by tile rather than from all the cells of each zone. For integer
+        rasters the histograms count each value and the percentiles are
+        exact; for float rasters the values are counted in logarithmic
+        buckets, whose values are within `relative_accuracy` of the values
+        of their cells.
+    n_jobs : int, default 1
+        The number of processes among which the "label" engine splits the
+        tiles of the raster. -1 uses all CPUs. Each process reopens the
+        rasters from their paths, and its partial stats (count, sum, sum of
+        squared deviations, min, max and histograms) are merged per zone.
+    coverage : {"binary", "fraction"}, default "binary"
+        "binary" summarizes every cell touched by a zone, which overcounts
+        the boundary cells of zones that are small relative to the cells.
+        "fraction", for the "label" engine, weights each cell by the fraction
+        of it covered by the zone, estimated from the centers of 8 x 8
+        subcells. 'count' and 'nodata' are then sums of fractions, 'sum',
+        'mean' and 'std' are weighted by them, and 'min', 'max' and 'range'
+        are of the cells partly covered. Percentiles are not supported.
+    label_cache : str, optional
+        A directory in which the "label" engine saves the zone labels of each
+        tile as .npy files, keyed by the fingerprint of the zone geometries,
+        the transform and shape of the raster grid and `coverage`. Later
+        calls with the same zones and any raster on the same grid
+        memory-map the labels instead of burning the zones again.
 
     Returns
     -------
@@ -61,31 +939,137 @@ def zonal_stats_raster(zone_gdf, raster, stats=None,
     """
     if not GeoDataFrameManager(zone_gdf).geom_type_validate("Polygon"):
         raise ValueError("zone GeoDataFrame must be polygon.")
-    gdf_crs = zone_gdf.crs
-
-    rast_manager = RasterManager.from_path(raster, nodata)
-    rast_crs = rast_manager.get_rio_crs()
-
-    if gdf_crs.to_epsg() != rast_crs.to_epsg():
-        projected_rast = rast_manager.reproject_vrt(
-            crs=f"EPSG:{gdf_crs.to_epsg()}"
-        )
-        rast_manager = RasterManager(projected_rast)
+    rasters = raster if isinstance(raster, list) else [raster]
+    if isinstance(stats_prefix, str):
+        stats_prefix = [stats_prefix] if len(rasters) == 1 else \
+            [f'{stats_prefix}_{i}' for i in range(len(rasters))]
+    if len(stats_prefix) != len(rasters):
+        raise ValueError("stats_prefix must have one prefix per raster.")
+    if engine not in ('rasterstats', 'label'):
+        raise ValueError('engine must be either "rasterstats" or "label".')
+    if coverage not in ('binary', 'fraction'):
+        raise ValueError('coverage must be either "binary" or "fraction".')
+    if coverage == 'fraction' and engine != 'label':
+        raise ValueError('coverage "fraction" requires engine "label".')
+    if label_cache is not None and engine != 'label':
+        raise ValueError('label_cache requires engine "label".')
+    if reproject not in ('raster', 'zones'):
+        raise ValueError('reproject must be either "raster" or "zones".')
+    supersample = _SUPERSAMPLE if coverage == 'fraction' else None
 
-    rast_arr, cellsize, max_y, min_x, nodata = rast_manager.as_rebuild_info()
-
-    affine = _to_affine(cellsize, max_y, min_x)
-    zonal_output = zonal_stats(vectors=zone_gdf.geometry, raster=rast_arr,
-                               nodata=nodata, affine=affine, stats=stats,
-                               all_touched=True)
-    zone_gdf.reset_index(drop=True, inplace=True)
     if not stats:
         from rasterstats.utils import DEFAULT_STATS
         stats = DEFAULT_STATS
     elif isinstance(stats, str):
         stats = stats.split()
+    if engine == 'label':
+        _validate_label_stats(stats, supersample)
+
+    # the arguments are validated before any raster is opened (and warped
+    # into warp_cache). The label engine reads the warped rasters window by
+    # window, which only matches a whole read with the exact (not
+    # approximated) transformer
+    vrt_options = {'tolerance': 0} if engine == 'label' else {}
+    rast_bands, zone_geoms = _open_rasters(zone_gdf, rasters, nodata,
+                                           reproject, warp_cache, vrt_options)
+
+    if engine == 'rasterstats':
+        zonal_outputs = []
+        for rast_manager, bidx, geom_crs in rast_bands:
+            rast_arr, cellsize, max_y, min_x, rast_nodata = \
+                rast_manager.as_rebuild_info(bidx)
+            affine = _to_affine(cellsize, max_y, min_x)
+            zonal_outputs.append(pd.DataFrame(zonal_stats(
+                vectors=zone_geoms[geom_crs], raster=rast_arr,
+                nodata=rast_nodata, affine=affine, stats=stats,
+                all_touched=True
+            )))
+    elif engine == 'label':
+        # rasters on the same grid share the zone labels
+        grids = {}
+        for i, (rast_manager, _, geom_crs) in enumerate(rast_bands):
+            rast_ds = rast_manager.rast_ds
+            grids.setdefault((geom_crs, rast_ds.transform, rast_ds.shape),
+                             []).append(i)
+        zonal_outputs = [None] * len(rast_bands)
+        for (geom_crs, _, _), positions in grids.items():
+            grid_outputs = _label_stats(
+                zone_geoms[geom_crs],
+                [rast_bands[i][:2] for i in positions], stats,
+                relative_accuracy=relative_accuracy, n_jobs=n_jobs,
+                supersample=supersample, label_cache=label_cache
+            )
+            for i, zonal_output in zip(positions, grid_outputs):
+                zonal_outputs[i] = zonal_output
+    zone_gdf.reset_index(drop=True, inplace=True)
+
+    stats_df = pd.concat([
+        zonal_output.rename(columns={stat: f'{prefix}_{stat}'
+                                     for stat in stats})
+        for prefix, zonal_output in zip(stats_prefix, zonal_outputs)
+    ], axis=1)
+    return zone_gdf.join(stats_df)
+
+
+def tabulate(zone_gdf, raster, nodata=None, area_unit='square meters',
+             all_touched=False, reproject='raster', warp_cache=None,
+             n_jobs=1, label_cache=None):
+    """
+    Calculate the area of each class of a categorical raster in each zone.
+
+    Parameters
+    ----------
+    zone_gdf : geopandas.GeoDataFrame
+        The zone GeoDataFrame whose geometry must be polygon.
+    raster : str or tuple of (str, int)
+        A path to a tif file of integer classes, e.g., land cover, or a
+        (path, band index) tuple.
+    nodata : int, optional
+        Value for no data cells, which are not tabulated.
+    area_unit : str, default 'square meters'
+        A string of the area unit of the output.
+    all_touched : bool, default False
+        Whether all cells touched by a zone are tabulated, or only the cells
+        whose centers are in the zone, in which case the areas of adjacent
+        zones do not overlap.
+    reproject, warp_cache, n_jobs, label_cache
+        See ``zonal_stats_raster``.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The area of each class (columns) in each zone (rows, with the index
+        of zone_gdf). The zones are burned into label arrays, and the cells
+        of each (zone, class) pair are counted with one ``np.bincount`` of
+        the combined codes per tile, reading the raster tile by tile.
+
+    Examples
+    --------
+    Tabulate the area of each habitat class in each census tract, in acres.
+
+    >>> pylusat.zonal.tabulate(acs2016_gdf, habitat_tif, nodata=255,
+                               area_unit='acre')
+         0    3         5    6          7           8  ...
+    0  0.0  0.0  0.000000  0.0  25.575305   50.705821  ...
+    1  0.0  0.0  0.000000  0.0   5.782243    5.115061  ...
+    2  0.0  0.0  0.444788  0.0  59.823974  329.365445  ...
+    """
+    if not GeoDataFrameManager(zone_gdf).geom_type_validate("Polygon"):
+        raise ValueError("zone GeoDataFrame must be polygon.")
+    rast_bands, zone_geoms = _open_rasters(zone_gdf, [raster], nodata,
+                                           reproject, warp_cache,
+                                           {'tolerance': 0})
+    rast_manager, bidx, geom_crs = rast_bands[0]
+    if not np.can_cast(rast_manager.dtype, np.int32):
+        raise ValueError("raster must have integer values of up to 32 bits.")
+    geoms = zone_geoms[geom_crs]
+    accumulator, = _label_accumulate(geoms, [(rast_manager, bidx)],
+                                     all_touched, n_jobs=n_jobs,
+                                     label_cache=label_cache, classes=True)
 
-    col_names = [f'{stats_prefix}_{stat}' for stat in stats]
-    output_gdf = zone_gdf.join(pd.DataFrame(zonal_output))
-    output_gdf.rename(columns=dict(zip(stats, col_names)), inplace=True)
-    return output_gdf
+    transform = rast_manager.rast_ds.transform
+    unit = GeoDataFrameManager(GeoDataFrame(geometry=geoms)).geom_unit_id
+    cell_area = abs(transform.a * transform.e) * \
+        UnitHandler(f'square {unit}').convert(area_unit)
+    return pd.DataFrame(accumulator.counts * cell_area, index=zone_gdf.index,
+                        columns=accumulator.classes.astype(rast_manager.dtype))